@@ -1,20 +1,233 @@
 import numpy as np
-import copy as copy
+import columns as columns #for growing columns
 #agent.py
 #stores the agent class and related functionality
 
-#route_step = [next_service_name,node.name]
+#paths are stored as int32 arrays of route steps, [schedule_id,node_id,schedule_id,node_id,...]
+#route_step = [next_schedule_id,alight_node_id]
+
+#build a path from the parent pointers left by a pathfinding search
+#parent_nodes[n] is the node we boarded at to reach node n and parent_schedules[n] the schedule we caught there, -1 at the start of the path
+def build_path_from_parents(parent_nodes,parent_schedules,destination_index):
+    steps = []
+    node_index = destination_index
+    while parent_nodes[node_index]!=-1: #walk back from the destination until we reach the start
+        steps.append(node_index)
+        steps.append(parent_schedules[node_index])
+        node_index = parent_nodes[node_index]
+    steps.reverse() #steps were found from the destination backwards
+    return np.array(steps,dtype=np.int32)
+
+#table of completed trips, storing only what is needed to evaluate them once the agent making the trip is released
+class TripRecords:
+    __slots__ = ("size","capacity","start_nodes","destination_nodes","start_times","end_times","number_passengers")
+    column_names = ("start_nodes","destination_nodes","start_times","end_times","number_passengers")
+
+    def __init__(self,capacity=1024):
+        self.size = 0 #number of trips recorded
+        self.capacity = capacity #number of trips which can be recorded before the columns must grow
+        self.start_nodes = np.zeros(capacity,dtype=np.int32) #id of the node each trip started at
+        self.destination_nodes = np.zeros(capacity,dtype=np.int32) #id of the node each trip finished at
+        self.start_times = np.zeros(capacity,dtype=np.float64) #time each trip started
+        self.end_times = np.zeros(capacity,dtype=np.float64) #time each trip finished
+        self.number_passengers = np.zeros(capacity,dtype=np.int32) #number of passengers who made each trip
+
+    def __len__(self):
+        return self.size
+
+    #record a completed trip
+    def add(self,start_node_id,destination_node_id,start_time,end_time,number_passengers):
+        if self.size==self.capacity:
+            self.capacity = self.capacity*2
+            columns.grow_columns(self,TripRecords.column_names,self.size,self.capacity)
+        index = self.size
+        self.start_nodes[index] = start_node_id
+        self.destination_nodes[index] = destination_node_id
+        self.start_times[index] = start_time
+        self.end_times[index] = end_time
+        self.number_passengers[index] = number_passengers
+        self.size = index+1
+
+    #provide the time taken by each trip
+    def travel_times(self):
+        return self.end_times[:self.size]-self.start_times[:self.size]
+
+    #total number of passengers who have completed their trips
+    def total_passengers(self):
+        return int(np.sum(self.number_passengers[:self.size],dtype=np.int64))
+
+#store of all agents in the network as columns of arrays, rather than one object per agent
+#an agent is the index of its row, nodes and vehicles hold these indices rather than agent objects
+#paths of all agents are stored one after another in a single path pool, an agent's path is path_pool[path_starts[i]:path_ends[i]]
+#and path_positions[i] is the position in the path pool of the agent's next route step
+#agents who have finished are released, their rows are reused by new agents and their paths are removed when the path pool is compacted
+#so the memory used follows the number of agents in the network rather than the total number of trips made
+class AgentStore:
+    __slots__ = ("size","capacity","start_nodes","destination_nodes","start_times","number_passengers","path_starts","path_ends","path_positions","done",
+                 "path_pool","path_pool_size","free_rows")
+    column_names = ("start_nodes","destination_nodes","start_times","number_passengers","path_starts","path_ends","path_positions","done")
+
+    def __init__(self,capacity=1024,path_capacity=4096):
+        self.size = 0 #number of rows in use, including released rows which have not been reused
+        self.capacity = capacity #number of agents which can be stored before the columns must grow
+        self.start_nodes = np.zeros(capacity,dtype=np.int32) #id of the node each agent started at
+        self.destination_nodes = np.zeros(capacity,dtype=np.int32) #id of the node each agent is travelling too
+        self.start_times = np.zeros(capacity,dtype=np.float64) #time each agent was created
+        self.number_passengers = np.zeros(capacity,dtype=np.int32) #number of passengers represented by each agent
+        self.path_starts = np.zeros(capacity,dtype=np.int64) #start of each agent's path in the path pool
+        self.path_ends = np.zeros(capacity,dtype=np.int64) #end of each agent's path in the path pool
+        self.path_positions = np.zeros(capacity,dtype=np.int64) #position of each agent's next route step in the path pool
+        self.done = np.zeros(capacity,dtype=bool) #has the agent reached their destination yet, also true for released rows
+        self.path_pool = np.zeros(path_capacity,dtype=np.int32) #route steps of all paths, [schedule_id,node_id,...]
+        self.path_pool_size = 0 #number of route steps stored in the path pool
+        self.free_rows = [] #rows of released agents, which are reused before new rows are added
+
+    #number of agents in the network
+    def __len__(self):
+        return self.size-len(self.free_rows)
+
+    #provide a row for a new agent, reusing the row of a released agent if possible
+    def new_row(self):
+        if len(self.free_rows)>0:
+            return self.free_rows.pop()
+        if self.size==self.capacity:
+            self.capacity = self.capacity*2 #double the size of the agent columns
+            columns.grow_columns(self,AgentStore.column_names,self.size,self.capacity)
+        index = self.size
+        self.size = index+1
+        return index
+
+    #release an agent, its row will be reused and its path removed when the path pool is next compacted
+    def release(self,index):
+        self.done[index] = True
+        self.free_rows.append(index)
+
+    #record the trip of an agent who has reached their destination, then release the agent
+    def retire(self,index,end_time,trip_records):
+        trip_records.add(self.start_nodes[index],self.destination_nodes[index],self.start_times[index],end_time,self.number_passengers[index])
+        self.release(index)
+
+    #move the paths of agents who have not been released to the start of the path pool, removing the paths of released agents
+    #agents split from each other share a path, which is kept once
+    def compact_paths(self):
+        live_rows = np.flatnonzero(~self.done[:self.size])
+        path_starts = self.path_starts[live_rows]
+        unique_starts,first_rows,row_paths = np.unique(path_starts,return_index=True,return_inverse=True)
+        path_lengths = self.path_ends[live_rows][first_rows]-unique_starts
+        new_starts = np.cumsum(path_lengths)-path_lengths
+        new_pool_size = int(np.sum(path_lengths))
+        old_positions = np.repeat(unique_starts-new_starts,path_lengths)+np.arange(new_pool_size) #position in the old pool of each step in the new pool
+        self.path_pool[:new_pool_size] = self.path_pool[old_positions]
+        self.path_pool_size = new_pool_size
+        shift = (new_starts-unique_starts)[row_paths] #how far each agent's path has moved
+        self.path_starts[live_rows] += shift
+        self.path_ends[live_rows] += shift
+        self.path_positions[live_rows] += shift
+
+    #store a path in the path pool, and return where it starts and ends
+    #when the pool is full it is compacted if at least half of it is released paths, otherwise it grows
+    def add_path(self,path):
+        path_length = len(path)
+        if self.path_pool_size+path_length>len(self.path_pool):
+            self.compact_paths()
+            while 2*(self.path_pool_size+path_length)>len(self.path_pool):
+                new_pool = np.zeros(len(self.path_pool)*2,dtype=np.int32)
+                new_pool[:self.path_pool_size] = self.path_pool[:self.path_pool_size]
+                self.path_pool = new_pool
+        path_start = self.path_pool_size
+        self.path_pool[path_start:path_start+path_length] = path
+        self.path_pool_size = path_start+path_length
+        return path_start,path_start+path_length
+
+    #add a new agent with a path, returning its index
+    def add(self,start_node_id,destination_node_id,start_time,number_passengers,path):
+        path_start,path_end = self.add_path(path) #store the path first, so the pool is never compacted while the new row is half written
+        index = self.new_row()
+        self.start_nodes[index] = start_node_id
+        self.destination_nodes[index] = destination_node_id
+        self.start_times[index] = start_time
+        self.number_passengers[index] = number_passengers
+        self.path_starts[index] = path_start
+        self.path_ends[index] = path_end
+        self.path_positions[index] = path_start
+        self.done[index] = False
+        return index
+
+    #split some passengers off an agent into a new agent at the same point along the same path, returning the index of the new agent
+    #paths in the pool are never modified, so both agents share the same path
+    def split(self,index,number_passengers):
+        new_index = self.new_row()
+        self.start_nodes[new_index] = self.start_nodes[index]
+        self.destination_nodes[new_index] = self.destination_nodes[index]
+        self.start_times[new_index] = self.start_times[index]
+        self.number_passengers[new_index] = number_passengers
+        self.number_passengers[index] = self.number_passengers[index]-number_passengers
+        self.path_starts[new_index] = self.path_starts[index]
+        self.path_ends[new_index] = self.path_ends[index]
+        self.path_positions[new_index] = self.path_positions[index]
+        self.done[new_index] = False
+        return new_index
+
+    #merge an agent into another agent with the same remaining path, releasing it, and return the index of the merged agent
+    #the merged start time is the passenger weighted mean of the two, so the total time passengers spend travelling is unchanged
+    #only agents with the same cohort key are merged, so both have the same start node and the trip records keep the right origins
+    def merge(self,into_index,from_index):
+        into_passengers = self.number_passengers[into_index]
+        from_passengers = self.number_passengers[from_index]
+        total_passengers = into_passengers+from_passengers
+        if total_passengers>0:
+            self.start_times[into_index] = (self.start_times[into_index]*into_passengers+self.start_times[from_index]*from_passengers)/total_passengers
+        self.number_passengers[into_index] = total_passengers
+        self.release(from_index)
+        return into_index
+
+    #provide a key identifying an agent's start node and remaining path, agents with the same key at the same place behave identically and have the same trip origin
+    def cohort_key(self,index):
+        return self.start_nodes[index:index+1].tobytes() + self.path_pool[self.path_positions[index]:self.path_ends[index]].tobytes()
+
+    #provide the next route step of an agent's path, the schedule to board when waiting at a node or the node to alight at when aboard a vehicle
+    def next_step(self,index):
+        return int(self.path_pool[self.path_positions[index]])
+
+    #provide the remaining route steps of an agent's path
+    def remaining_path(self,index):
+        return self.path_pool[self.path_positions[index]:self.path_ends[index]]
+
+    #ask an agent if it wishes to board a vehicle of a particular schedule
+    def board(self,index,schedule_id):
+        position = self.path_positions[index]
+        if position<self.path_ends[index] and self.path_pool[position]==schedule_id:
+            #board if schedule id matches with next schedule to board
+            self.path_positions[index] = position+1 #we only wish to board this service once
+            return True
+        else:
+            return False
+
+    #ask an agent if it wishes to alight a vehicle at a particular node
+    def alight(self,index,node_id):
+        position = self.path_positions[index]
+        path_end = self.path_ends[index]
+        if position<path_end and self.path_pool[position]==node_id:
+            #alight if node id matches with next node to alight at
+            self.path_positions[index] = position+1 #we only wish to alight at this node once
+            if position+1==path_end:
+                return 2 #indicate agent has come to the end of its journey after alighting here
+            else:
+                return 1 #indicate agent has alighted here, but still exists
+        else:
+            return 0 #indicate not alighting here
 
 class Agent:
-    __slots__ = ("start_node","destination_node","id","start_time","network","destination_path","number_passengers","done")
+    __slots__ = ("start_node","destination_node","id","start_time","network","destination_path","path_position","number_passengers","done")
     
-    def __init__(self,start_node,destination_node,id,start_time,network,number_passengers,path):
+    def __init__(self,start_node,destination_node,id,start_time,network,number_passengers,path,path_position=0):
         self.start_node = start_node 
         self.destination_node = destination_node
         self.id = id
         self.start_time = start_time
         self.network = network #reference to the network object
-        self.destination_path = path #path of actions to the destination node
+        self.destination_path = path #path of actions to the destination node, this is never modified so may be shared between agents
+        self.path_position = path_position #index of the next route step in the path
         self.number_passengers = number_passengers #number of passengers represented by this agent
         #self.found_path = self.pathfind()
         self.done = False #has the agent reached their destination yet
@@ -25,7 +238,9 @@ class Agent:
     def pathfind(self):
         #print('start ',self.start_node.name,' destination ',self.destination_node.name) #DEBUG
         #get info about vehicles arriving at the starting node
-        start_next_service_times,start_nodes_after,start_node_times_after,start_schedule_names = self.start_node.provide_next_services(data_time=self.start_time,start=True)
+        start_next_service_times,start_stop_indices,start_stop_ends,start_schedule_ids = self.start_node.provide_next_services(data_time=self.start_time,start=True)
+        stop_nodes = self.network.timetable.stop_node_list #the stops of every schedule, the nodes after a station are read from here
+        stop_times = self.network.timetable.stop_time_list
         #get index (id) of starting and ending nodes in the network structure
         start_node_index = self.start_node.id
         destination_node_index = self.destination_node.id
@@ -35,7 +250,8 @@ class Agent:
         evaluated_nodes = np.zeros(num_nodes_in_network)  #when a node is evaluated the value in this matrix is set to infinite, ensuring that node is never evaluated again
         distance_to_nodes[start_node_index] = 0 #initial distance to reach the starting node is 0
         distance_to_final_destination = self.network.distance_to_all[:,destination_node_index]
-        path_to_nodes = [[] for _ in range(num_nodes_in_network)] #create an empty nested list of the required length to store paths to nodes
+        parent_nodes = [-1]*num_nodes_in_network #node we boarded at to reach each node, paths are built from these once the destination is found
+        parent_schedules = [-1]*num_nodes_in_network #schedule we caught to reach each node
         #now that we have extracted preliminary data, start the pathfinding operation
         while True: #loop till we meet an exit condition
             expected_distance_to_nodes = distance_to_nodes + distance_to_final_destination + evaluated_nodes #expected (minimal) distance to reach a node
@@ -47,7 +263,8 @@ class Agent:
                 break #break out of the loop, we have explored all the network we can reach
             elif min_index == destination_node_index:
                 #print('we have found the destination node')
-                self.destination_path = path_to_nodes[destination_node_index]
+                self.destination_path = build_path_from_parents(parent_nodes,parent_schedules,destination_node_index)
+                self.path_position = 0
                 #print(self.destination_path)
                 break
             else:
@@ -57,39 +274,32 @@ class Agent:
                 if min_index==start_node_index:
                     #use precalculated data from the starting node
                     next_service_times = start_next_service_times
-                    nodes_after = start_nodes_after
-                    times_after = start_node_times_after
-                    schedule_names = start_schedule_names
+                    stop_indices = start_stop_indices
+                    stop_ends = start_stop_ends
+                    schedule_ids = start_schedule_ids
 
                 else:
                     #otherwise calculate data about vehicle arrivials at nodes on the fly
-                    next_service_times,nodes_after,times_after,schedule_names = self.network.nodes[min_index].provide_next_services(start=False,data_time=current_time)
+                    next_service_times,stop_indices,stop_ends,schedule_ids = self.network.nodes[min_index].provide_next_services(start=False,data_time=current_time)
 
                 #now it's time to calculate the path to other nodes
                 num_schedules = len(next_service_times)
                 for i in range(num_schedules):
-                    #extract nodes and times after for this specific route
+                    #the nodes after the evaluation node on this route are the stops after it in the timetable
                     next_service_time = next_service_times[i]
-                    next_service_name = schedule_names[i]
-                    route_nodes_after = nodes_after[i]
-                    route_times_after = times_after[i]
-                    for j,node in enumerate(route_nodes_after):
-                        node_index = node.id
+                    next_service_id = schedule_ids[i]
+                    stop_time = stop_times[stop_indices[i]] #time to reach the evaluation node from the start of the schedule
+                    for k in range(stop_indices[i]+1,stop_ends[i]):
+                        node_index = stop_nodes[k]
                         distance_to_current_node_old_path = distance_to_nodes[node_index] #what is the current shortest path to the node we are looking at
-                        distance_to_current_node_new_path = minimum_distance + (next_service_time-current_time) + route_times_after[j] #how long to reach next node through evaluation node
+                        distance_to_current_node_new_path = minimum_distance + (next_service_time-current_time) + (stop_times[k]-stop_time) #how long to reach next node through evaluation node
                         #print('to reach ',node.name,' current best is ',distance_to_current_node_old_path,' new path is ',distance_to_current_node_new_path) #DEBUG
                         if distance_to_current_node_new_path<distance_to_current_node_old_path:
                             #if so, we have found a better path
                             #print('we have found a better path') #DEBUG
                             distance_to_nodes[node_index] = distance_to_current_node_new_path
-                            route_to_old_node = path_to_nodes[min_index] #extract the path to the evaluation node
-                            #print('route to previous node ',route_to_old_node) #DEBUG
-                            #print('route step ',route_step)
-                            route_to_new_node = copy.copy(route_to_old_node) #path to the next node is path to the evaluation node + new step
-                            route_to_new_node.append(next_service_name) #store the next service we need to catch
-                            route_to_new_node.append(node.name) #and when we need to get off that service
-                            #print('new route ',route_to_new_node) #DEBUG
-                            path_to_nodes[node_index] = route_to_new_node #store this in the list of all paths
+                            parent_nodes[node_index] = min_index #we reach the next node by boarding at the evaluation node
+                            parent_schedules[node_index] = next_service_id #and catching this schedule
                 
                 #mark the evaluated node as evaluated, it will not be evaluated again
                 evaluated_nodes[min_index] = np.inf
@@ -100,27 +310,25 @@ class Agent:
         else:
             return True #indicate we successfully found a path to their destination
     #ask the agent if it wishes to board a vehicle of a particular schedule
-    def board(self,schedule_name):
+    def board(self,schedule_id):
         #print('boarding' ,self.destination_path)
-        if schedule_name==self.destination_path[0]:
+        if self.path_position<len(self.destination_path) and schedule_id==self.destination_path[self.path_position]:
             #print('boarding boarding')
-            #board if schedule name matches with next schedule to board
-            del self.destination_path[0] #we only wish to board this service once
-            #print('boarding',self.destination_path)
+            #board if schedule id matches with next schedule to board
+            self.path_position = self.path_position + 1 #we only wish to board this service once
             return True
         else:
             return False
 
     #ask the agent if it wishes to alight a vehicle at a particular node
-    def alight(self,node_name):
+    def alight(self,node_id):
         #print('alighting',self.destination_path)
-        #print('node name ',node_name)
-        if node_name==self.destination_path[0]:
+        #print('node id ',node_id)
+        if self.path_position<len(self.destination_path) and node_id==self.destination_path[self.path_position]:
             #print('alighting alighting')
-            #alight if node name matches with next node to alight at
-            del self.destination_path[0] #we only wish to alight at this node once
-            #print('alighting',self.destination_path)
-            if len(self.destination_path)==0:
+            #alight if node id matches with next node to alight at
+            self.path_position = self.path_position + 1 #we only wish to alight at this node once
+            if self.path_position==len(self.destination_path):
                 return 2 #indicate agent has come to the end of its journey after alighting here
             else:
                 return 1 #indicate agent has alighted here, but still exists
@@ -131,7 +339,12 @@ class Agent:
     def test_agent_path(self):
         print('START ',self.start_node.name)
         print('DESTINATION ',self.destination_node.name)
-        print("PATH ",self.destination_path)
+        remaining_path = self.destination_path[self.path_position:]
+        path_names = []
+        for k in range(0,len(remaining_path),2):
+            path_names.append(self.network.schedule_names[remaining_path[k]]) #schedule to catch
+            path_names.append(self.network.node_names[remaining_path[k+1]]) #and where to get off
+        print("PATH ",path_names)
         
 
 
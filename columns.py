@@ -0,0 +1,11 @@
+#columns.py
+#stores helpers for tables kept as numpy columns on an object (the agent store, trip records, fleet and recorder), which grow by copying into larger columns
+import numpy as np
+
+#grow a set of columns stored as attributes of an object to a new capacity, keeping the first num_rows rows
+def grow_columns(columns_object,column_names,num_rows,capacity):
+    for column_name in column_names:
+        old_column = getattr(columns_object,column_name)
+        new_column = np.zeros(capacity,dtype=old_column.dtype)
+        new_column[:num_rows] = old_column[:num_rows]
+        setattr(columns_object,column_name,new_column)
@@ -0,0 +1,112 @@
+#connection_scan.py
+#stores the connection scan class, an earliest arrival journey planner over every elementary connection in the timetable
+import numpy as np
+import agent as a
+
+#a connection is a single vehicle travelling between two consecutive stops of its schedule
+#connections are stored in arrays sorted by departure time, so a one to all earliest arrival search is a single scan through them
+#each service (a schedule departing at a particular time) is a trip, a passenger who can reach any stop of a trip can ride it to every later stop
+class ConnectionScan:
+    __slots__ = ("num_nodes","num_trips","connection_departures","connection_arrivals","connection_from_nodes","connection_to_nodes","connection_trips","connection_schedules",
+                 "departures","arrivals","from_nodes","to_nodes","trips","schedules","earliest_arrivals","parent_nodes","parent_schedules")
+
+    #build the connections from the compiled timetable of the network
+    def __init__(self,timetable):
+        self.num_nodes = timetable.num_nodes
+        self.num_trips = len(timetable.departures)
+        departures = []
+        arrivals = []
+        from_nodes = []
+        to_nodes = []
+        trips = []
+        schedules = []
+        for s in range(timetable.num_schedules):
+            stop_nodes,stop_times = timetable.schedule_stops(s)
+            service_departures = timetable.schedule_departures(s)
+            num_legs = len(stop_nodes)-1
+            if num_legs<1 or len(service_departures)==0:
+                continue #schedule never moves between stops
+            first_trip = timetable.departure_offsets[s]
+            #one connection for every leg of every service of the schedule
+            departures.append((service_departures[:,None]+stop_times[None,:-1]).ravel())
+            arrivals.append((service_departures[:,None]+stop_times[None,1:]).ravel())
+            from_nodes.append(np.tile(stop_nodes[:-1],len(service_departures)))
+            to_nodes.append(np.tile(stop_nodes[1:],len(service_departures)))
+            trips.append(np.repeat(np.arange(first_trip,first_trip+len(service_departures)),num_legs))
+            schedules.append(np.full(num_legs*len(service_departures),s))
+        if len(departures)>0:
+            departures = np.concatenate(departures)
+            arrivals = np.concatenate(arrivals)
+            order = np.lexsort((arrivals,departures)) #sort by departure time, then by arrival time so zero length connections are scanned in order
+            self.connection_departures = departures[order]
+            self.connection_arrivals = arrivals[order]
+            self.connection_from_nodes = np.concatenate(from_nodes)[order]
+            self.connection_to_nodes = np.concatenate(to_nodes)[order]
+            self.connection_trips = np.concatenate(trips)[order]
+            self.connection_schedules = np.concatenate(schedules)[order]
+        else:
+            self.connection_departures = np.zeros(0)
+            self.connection_arrivals = np.zeros(0)
+            self.connection_from_nodes = np.zeros(0,dtype=np.int64)
+            self.connection_to_nodes = np.zeros(0,dtype=np.int64)
+            self.connection_trips = np.zeros(0,dtype=np.int64)
+            self.connection_schedules = np.zeros(0,dtype=np.int64)
+        #the scan itself is sequential, and is faster over python lists than indexing numpy arrays one element at a time
+        self.departures = self.connection_departures.tolist()
+        self.arrivals = self.connection_arrivals.tolist()
+        self.from_nodes = self.connection_from_nodes.tolist()
+        self.to_nodes = self.connection_to_nodes.tolist()
+        self.trips = self.connection_trips.tolist()
+        self.schedules = self.connection_schedules.tolist()
+
+    #find the earliest arrival at every node where num_passengers_to_node is greater than 0, leaving the start node at start_time
+    #mirrors Node.find_paths, returning the number of passengers to each node (zero if unreachable) and the number of passengers who cannot reach their destination
+    def find_paths(self,start_index,num_passengers_to_node,start_time):
+        num_nodes = self.num_nodes
+        earliest_arrivals = [np.inf]*num_nodes #earliest time we can reach each node
+        earliest_arrivals[start_index] = start_time
+        parent_nodes = [-1]*num_nodes #node we boarded at to reach each node, -1 if the node has not been reached (or is the start)
+        parent_schedules = [-1]*num_nodes #schedule we rode to reach each node
+        trip_board_nodes = [-1]*self.num_trips #first node at which we can board each trip, -1 if we cannot board it
+        destination_nodes = (num_passengers_to_node>0).tolist()
+        destination_indices = [j for j in range(num_nodes) if destination_nodes[j]==True]
+        latest_destination_arrival = max([earliest_arrivals[j] for j in destination_indices],default=start_time) #once connections depart after this, no destination can be improved
+        departures = self.departures
+        arrivals = self.arrivals
+        from_nodes = self.from_nodes
+        to_nodes = self.to_nodes
+        trips = self.trips
+        schedules = self.schedules
+        first_connection = int(self.connection_departures.searchsorted(start_time,side='left')) #connections which depart before we start cannot be caught
+        for c in range(first_connection,len(departures)):
+            departure = departures[c]
+            if departure>=latest_destination_arrival:
+                break #we have found the earliest arrival at all the destinations we wish to reach
+            trip = trips[c]
+            board_node = trip_board_nodes[trip]
+            if board_node==-1: #we are not yet aboard this trip, can we board it here?
+                from_node = from_nodes[c]
+                if earliest_arrivals[from_node]>departure:
+                    continue #we cannot reach the stop before the vehicle leaves
+                trip_board_nodes[trip] = from_node
+                board_node = from_node
+            to_node = to_nodes[c]
+            arrival = arrivals[c]
+            if arrival<earliest_arrivals[to_node]: #we have found an earlier arrival at the next stop
+                earliest_arrivals[to_node] = arrival
+                parent_nodes[to_node] = board_node
+                parent_schedules[to_node] = schedules[c]
+                if destination_nodes[to_node]==True:
+                    latest_destination_arrival = max([earliest_arrivals[j] for j in destination_indices])
+        self.earliest_arrivals = earliest_arrivals
+        self.parent_nodes = parent_nodes
+        self.parent_schedules = parent_schedules
+        #as with Node.find_paths, return the number of passengers going to an unreachable station as zero, and the number of passengers who failed to reach their destination
+        unreachable_nodes = np.isinf(earliest_arrivals) #the passenger cannot reach these nodes
+        num_unreachable_passengers = np.sum(num_passengers_to_node[unreachable_nodes]) #add them to the total of failed passengers
+        num_passengers_to_node[unreachable_nodes] = 0 #do not create any passengers trying to reach this node
+        return num_passengers_to_node,num_unreachable_passengers
+
+    #build the path from the start node to a destination found by the last call to find_paths
+    def build_path(self,destination_index):
+        return a.build_path_from_parents(self.parent_nodes,self.parent_schedules,destination_index)
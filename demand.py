@@ -0,0 +1,92 @@
+#demand.py
+#stores the demand stream class and related functionality, used to draw how many passengers travel between each pair of nodes over time
+import numpy as np
+
+#calculate the passenger time multiplier at a time, interpolating linearly between the traffic multipliers of the scenario
+#this sets the number of passengers generated to vary throughout the day
+def interpolate_time_multiplier(current_time,traffic_multiplier,traffic_time_gap,stop_simulation_time):
+    if current_time>=stop_simulation_time:
+        return 0 #no passengers are generated after the end of the scenario
+    time_period = int(current_time/traffic_time_gap)
+    time_from_start = current_time-time_period*traffic_time_gap
+    start_time_multiplier = traffic_multiplier[time_period]
+    end_time_multiplier = traffic_multiplier[time_period+1]
+    return start_time_multiplier*(1-time_from_start/traffic_time_gap) + end_time_multiplier*(time_from_start/traffic_time_gap)
+
+#draw the number of passengers created from the expected number, works on arrays of any shape
+#the whole part of the expected number is always created, and one more passenger with probability equal to the remainder
+def sample_trips(rng,expected_trips):
+    whole_trips = np.floor(expected_trips)
+    return whole_trips + (rng.random(np.shape(expected_trips))<expected_trips-whole_trips)
+
+#sample the passengers created every minute of the day in one go
+#origin_destination_trips is in passengers per hour, scaled each minute by the scenario's time multiplier
+#draws are made in the same order as when passengers are drawn each minute during the simulation, so the same seed gives the same passengers
+def sample_demand_stream(origin_destination_trips,traffic_multiplier,traffic_time_gap,stop_simulation_time,seed=30699):
+    rng = np.random.default_rng(seed)
+    num_nodes = len(origin_destination_trips)
+    times = []
+    origins = []
+    destinations = []
+    counts = []
+    for current_time in range(int(stop_simulation_time)):
+        multiplier = interpolate_time_multiplier(current_time,traffic_multiplier,traffic_time_gap,stop_simulation_time)
+        if multiplier<=0:
+            continue #no passengers are created at this time
+        num_passengers = sample_trips(rng,origin_destination_trips*(multiplier/60)) #we create passengers every minute, but statistics are per hour
+        origin_indices,destination_indices = np.nonzero(num_passengers)
+        times.append(np.full(len(origin_indices),current_time,dtype=np.int32))
+        origins.append(origin_indices.astype(np.int32))
+        destinations.append(destination_indices.astype(np.int32))
+        counts.append(num_passengers[origin_indices,destination_indices].astype(np.int32))
+    if len(times)==0:
+        return DemandStream(np.zeros(0,dtype=np.int32),np.zeros(0,dtype=np.int32),np.zeros(0,dtype=np.int32),np.zeros(0,dtype=np.int32),num_nodes)
+    return DemandStream(np.concatenate(times),np.concatenate(origins),np.concatenate(destinations),np.concatenate(counts),num_nodes)
+
+#load a demand stream saved with DemandStream.save
+def load_demand_stream(path):
+    data = np.load(path)
+    return DemandStream(data["times"],data["origins"],data["destinations"],data["counts"],int(data["num_nodes"]))
+
+#the passengers created over a whole day, stored as one entry per (time,origin,destination) with at least one passenger
+#entries are sorted by time and then by origin, and the entries at time t are times[tick_offsets[t]:tick_offsets[t+1]]
+#a stream does not depend on the schedules, so the same demand can be replayed against different schedules
+class DemandStream:
+    __slots__ = ("times","origins","destinations","counts","num_nodes","tick_offsets")
+
+    def __init__(self,times,origins,destinations,counts,num_nodes):
+        order = np.lexsort((origins,times)) #streams are built in time and origin order, but make sure, the sort is stable so destinations keep their order
+        self.times = np.asarray(times,dtype=np.int32)[order]
+        self.origins = np.asarray(origins,dtype=np.int32)[order]
+        self.destinations = np.asarray(destinations,dtype=np.int32)[order]
+        self.counts = np.asarray(counts,dtype=np.int32)[order]
+        self.num_nodes = num_nodes
+        last_time = int(self.times[-1]) if len(self.times)>0 else -1
+        self.tick_offsets = np.searchsorted(self.times,np.arange(last_time+2),side='left')
+
+    #provide the origins, destinations and number of passengers created at a time
+    def demand_at(self,current_time):
+        current_time = int(current_time)
+        if current_time<0 or current_time>=len(self.tick_offsets)-1:
+            empty = np.zeros(0,dtype=np.int32)
+            return empty,empty,empty #no passengers are created at this time
+        start = self.tick_offsets[current_time]
+        end = self.tick_offsets[current_time+1]
+        return self.origins[start:end],self.destinations[start:end],self.counts[start:end]
+
+    #provide the passengers created at a time grouped by origin, as a list of (origin, destinations, counts) in increasing order of origin
+    #only the entries created at that time are read, so the cost does not depend on the number of nodes
+    def demand_by_origin_at(self,current_time):
+        origins,destinations,counts = self.demand_at(current_time)
+        if len(origins)==0:
+            return []
+        bounds = np.concatenate(([0],np.flatnonzero(np.diff(origins))+1,[len(origins)])) #entries of the same origin are next to each other
+        return [(int(origins[start]),destinations[start:end],counts[start:end]) for start,end in zip(bounds[:-1].tolist(),bounds[1:].tolist())]
+
+    #total number of passengers in the stream
+    def total_passengers(self):
+        return int(np.sum(self.counts,dtype=np.int64))
+
+    #save the stream to a .npz file, so the same demand can be used in later runs
+    def save(self,path):
+        np.savez_compressed(path,times=self.times,origins=self.origins,destinations=self.destinations,counts=self.counts,num_nodes=self.num_nodes)
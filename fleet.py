@@ -0,0 +1,146 @@
+#fleet.py
+#stores the fleet class, which keeps the state of every vehicle in the network in arrays so that all vehicles are moved at once
+import numpy as np
+import columns as columns #for growing columns
+
+#vehicle states
+AT_STOP = 0
+MOVING = 1
+
+#the fleet stores one row per vehicle, in the order the vehicles were created, the vehicle objects themselves keep their agents and read their state from their row
+#a vehicle's position along its schedule is the index of its previous stop in the timetable's flat stop arrays (see timetable.Timetable)
+#each step moves every vehicle one unit of time with the same rules a single vehicle used to follow
+#a vehicle at a stop leaves along the next edge of its schedule, if the edge takes 1 unit of time it is at the next stop straight away
+#otherwise it moves until its move timer reaches the edge length - 1, and a vehicle stopped at its final destination is removed at the next step
+class Fleet:
+    __slots__ = ("size","capacity","vehicles","vehicle_ids","schedule_ids","stop_indices","states","new","move_timers","edge_lengths","loads",
+                 "first_stops","stop_nodes","leg_times","final_nodes","nodes","node_latitudes","node_longitudes")
+    column_names = ("vehicle_ids","schedule_ids","stop_indices","states","new","move_timers","edge_lengths","loads")
+
+    #build the fleet's view of the schedules from the compiled timetable, the schedules (for the travel time of each edge) and the nodes of the network
+    def __init__(self,timetable,schedules,nodes,capacity=64):
+        self.size = 0 #number of vehicles in the fleet
+        self.capacity = capacity #number of vehicles which can be stored before the columns must grow
+        self.vehicles = [] #vehicle objects, in the same order as the rows of the fleet
+        self.vehicle_ids = np.zeros(capacity,dtype=np.int64) #id of each vehicle
+        self.schedule_ids = np.zeros(capacity,dtype=np.int64) #schedule each vehicle follows
+        self.stop_indices = np.zeros(capacity,dtype=np.int64) #index of each vehicle's previous stop in the flat stop arrays
+        self.states = np.zeros(capacity,dtype=np.int8) #AT_STOP or MOVING
+        self.new = np.zeros(capacity,dtype=bool) #newly created vehicles will not stop if their final destination is their current stop, to allow the city circle to function
+        self.move_timers = np.zeros(capacity,dtype=np.int64) #units of time each vehicle has moved along its current edge
+        self.edge_lengths = np.zeros(capacity,dtype=np.float64) #travel time of the edge each vehicle is moving along
+        self.loads = np.zeros(capacity,dtype=np.int64) #number of passengers in each vehicle
+        self.first_stops = timetable.stop_offsets[:-1] #index of the first stop of each schedule
+        self.stop_nodes = timetable.stop_nodes
+        self.leg_times = np.zeros(len(timetable.stop_nodes)) #travel time of the edge from each stop to the next stop of its schedule, 0 for the last stop
+        for schedule_id,schedule in enumerate(schedules):
+            first_stop = timetable.stop_offsets[schedule_id]
+            self.leg_times[first_stop:first_stop+len(schedule.edges)] = [edge.travel_time for edge in schedule.edges]
+        last_stops = np.maximum(timetable.stop_offsets[1:]-1,0)
+        self.final_nodes = self.stop_nodes[last_stops] if len(self.stop_nodes)>0 else np.zeros(len(schedules),dtype=np.int64) #node id of the final destination of each schedule
+        self.nodes = nodes
+        self.node_latitudes = np.array([node.latitude for node in nodes],dtype=np.float64)
+        self.node_longitudes = np.array([node.longitude for node in nodes],dtype=np.float64)
+
+    def __len__(self):
+        return self.size
+
+    #add a vehicle at the first stop of its schedule, returns the vehicle's row
+    def add(self,vehicle,schedule_id):
+        if self.size==self.capacity:
+            self.capacity = self.capacity*2
+            columns.grow_columns(self,Fleet.column_names,self.size,self.capacity)
+        index = self.size
+        self.vehicle_ids[index] = vehicle.id
+        self.schedule_ids[index] = schedule_id
+        self.stop_indices[index] = self.first_stops[schedule_id]
+        self.states[index] = AT_STOP
+        self.new[index] = True
+        self.move_timers[index] = 0
+        self.edge_lengths[index] = 0
+        self.loads[index] = 0
+        self.vehicles.append(vehicle)
+        self.size = index+1
+        return index
+
+    #move every vehicle one unit of time, returns the vehicles which reached the end of their path and were removed, in fleet order
+    #the cost of a step does not depend on the number of vehicles beyond the array operations, which are done for all vehicles at once
+    def step(self):
+        n = self.size
+        states = self.states[:n]
+        stop_indices = self.stop_indices[:n]
+        move_timers = self.move_timers[:n]
+        edge_lengths = self.edge_lengths[:n]
+        new = self.new[:n]
+        #masks are all taken from the state before the step
+        at_stop = states==AT_STOP
+        finished = at_stop & ~new & (self.stop_nodes[stop_indices]==self.final_nodes[self.schedule_ids[:n]])
+        departing = at_stop & ~finished
+        arriving = ~at_stop & (move_timers==edge_lengths-1)
+        still_moving = ~at_stop & ~arriving
+        #vehicles at a stop leave along the next edge of their schedule
+        new[departing] = False
+        edge_lengths[departing] = self.leg_times[stop_indices[departing]]
+        instant = departing & (edge_lengths==1) #edges taking 1 unit of time, we are immediately at the next stop
+        starting = departing & ~instant
+        states[starting] = MOVING
+        move_timers[starting] = 1
+        #moving vehicles either reach the next stop or keep moving
+        states[arriving] = AT_STOP
+        stop_indices[instant|arriving] += 1
+        move_timers[still_moving] += 1
+        if not finished.any():
+            return []
+        #remove the finished vehicles, keeping the rest in order
+        finished_vehicles = [vehicle for vehicle,done in zip(self.vehicles,finished.tolist()) if done==True]
+        self.remove(~finished)
+        return finished_vehicles
+
+    #keep only the vehicles where keep is True, renumbering their rows
+    def remove(self,keep):
+        n = self.size
+        num_kept = int(np.count_nonzero(keep))
+        for column_name in Fleet.column_names:
+            column = getattr(self,column_name)
+            column[:num_kept] = column[:n][keep]
+        self.vehicles[:] = [vehicle for vehicle,kept in zip(self.vehicles,keep.tolist()) if kept==True] #in place, as the network shares this list
+        for index,vehicle in enumerate(self.vehicles):
+            vehicle.slot = index
+        self.size = num_kept
+
+    #provide the vehicles which are stopped, in fleet order
+    def stopped_vehicles(self):
+        return [self.vehicles[index] for index in np.flatnonzero(self.states[:self.size]==AT_STOP).tolist()]
+
+    #provide the latitude and longitude of every vehicle as arrays, in fleet order
+    #a stopped vehicle is at its stop, a moving vehicle is along the straight line between its previous stop and its next stop
+    def coordinates(self):
+        n = self.size
+        stop_indices = self.stop_indices[:n]
+        moving = self.states[:n]==MOVING
+        previous_nodes = self.stop_nodes[stop_indices]
+        next_nodes = self.stop_nodes[np.where(moving,stop_indices+1,stop_indices)] #stopped vehicles may be at the last stop of the timetable
+        fraction_moved = np.where(moving,self.move_timers[:n]/np.where(moving,self.edge_lengths[:n],1),0)
+        latitudes = np.where(moving,self.node_latitudes[previous_nodes]*(1-fraction_moved) + self.node_latitudes[next_nodes]*fraction_moved,self.node_latitudes[previous_nodes])
+        longitudes = np.where(moving,self.node_longitudes[previous_nodes]*(1-fraction_moved) + self.node_longitudes[next_nodes]*fraction_moved,self.node_longitudes[previous_nodes])
+        return latitudes,longitudes
+
+    #move every vehicle num_steps units of time at once, as step does for the minutes between events
+    #every vehicle must be moving and none may reach its next stop in that time, so only the move timers change
+    #returns the latitudes and longitudes of every vehicle after each step, as (num_steps x vehicles) arrays
+    def advance(self,num_steps):
+        n = self.size
+        stop_indices = self.stop_indices[:n]
+        move_timers = self.move_timers[:n]
+        edge_lengths = self.edge_lengths[:n]
+        steps_to_arrive = edge_lengths-1-move_timers #a vehicle arrives at the step where its move timer equals its edge length - 1
+        arriving = (steps_to_arrive>=0) & (steps_to_arrive<num_steps) & (steps_to_arrive==np.floor(steps_to_arrive))
+        if np.any(self.states[:n]!=MOVING) or np.any(arriving):
+            raise ValueError('vehicles can only be advanced while they are all moving and none reach a stop')
+        previous_nodes = self.stop_nodes[stop_indices]
+        next_nodes = self.stop_nodes[stop_indices+1]
+        fraction_moved = (move_timers+np.arange(1,num_steps+1)[:,None])/edge_lengths #one row per step
+        latitudes = self.node_latitudes[previous_nodes]*(1-fraction_moved) + self.node_latitudes[next_nodes]*fraction_moved
+        longitudes = self.node_longitudes[previous_nodes]*(1-fraction_moved) + self.node_longitudes[next_nodes]*fraction_moved
+        move_timers += num_steps
+        return latitudes,longitudes
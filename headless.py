@@ -0,0 +1,145 @@
+#headless.py
+#runs the simulation and evaluation from the command line without the GUI, writing the results to files
+#nothing GUI related (tkinter, render) is imported, so this can be scripted and run in parallel on machines without a display
+#example: python headless.py --output-dir results/sydney --scenario ScenarioVariable.csv
+#a trace saved with --trace can be evaluated again without simulating: python headless.py --load-trace results/sydney/trace --output-dir results/sydney_again
+
+import argparse as argparse
+import contextlib as contextlib #for silencing the simulation's printing
+import json as json
+import os as os
+import time as time
+import pandas as pd
+import network as n
+import evaluator as e
+import demand as demand
+import simulation_trace as simulation_trace
+
+#the same default files as the GUI
+DEFAULT_NODES = 'nodes_sydney.csv'
+DEFAULT_EDGES = 'edges_sydney.csv'
+DEFAULT_SCHEDULE = 'schedule_sydney.csv'
+DEFAULT_SEGMENT_SCHEDULE = 'schedule_segments_sydney.csv'
+DEFAULT_PARAMETERS = 'parameters_sydney.csv'
+DEFAULT_EVAL = 'eval_sydney.csv'
+DEFAULT_SCENARIO = 'ScenarioFixed.csv'
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='run the public transport simulation and evaluation without the GUI')
+    parser.add_argument('--nodes',default=DEFAULT_NODES,help='nodes csv file')
+    parser.add_argument('--edges',default=DEFAULT_EDGES,help='edges csv file')
+    parser.add_argument('--schedule',default=DEFAULT_SCHEDULE,help='schedule csv file')
+    parser.add_argument('--segments',default=DEFAULT_SEGMENT_SCHEDULE,help='schedule segments csv file, an empty string uses simple schedule generation')
+    parser.add_argument('--parameters',default=DEFAULT_PARAMETERS,help='network and simulation parameters csv file')
+    parser.add_argument('--eval',default=DEFAULT_EVAL,help='evaluation costs csv file')
+    parser.add_argument('--scenario',default=DEFAULT_SCENARIO,help='scenario (traffic over the day) csv file')
+    parser.add_argument('--optimiser',default='hardcoded',choices=['hardcoded','henry_convex'],help='how the gaps between services are chosen')
+    parser.add_argument('--routing-engine',default='dijkstra',choices=['dijkstra','csa','raptor'],help='journey planner used by passengers')
+    parser.add_argument('--max-transfers',type=int,default=None,help='maximum number of transfers when using raptor')
+    parser.add_argument('--sim',default='basic',choices=['basic','event'],help='basic_sim steps every part of the network every minute, event_sim only runs the minutes in which vehicles stop, are dispatched or passengers are created, and moves and logs the minutes between them in one step')
+    parser.add_argument('--stop-time',type=float,default=None,help='minutes to simulate, by default the end of the scenario')
+    parser.add_argument('--cohorts',action='store_true',help='merge passengers with the same remaining path')
+    parser.add_argument('--demand-seed',type=int,default=30699,help='seed used to draw the number of passengers created')
+    parser.add_argument('--demand-stream',default=None,help='demand stream (.npz saved with demand.DemandStream.save) to create passengers from, in place of drawing them with the demand seed')
+    parser.add_argument('--output-dir',default='results',help='directory the results are written to')
+    parser.add_argument('--trace',action='store_true',help='stream the simulation logs to a trace in the output directory rather than keeping them in memory')
+    parser.add_argument('--load-trace',default=None,help='evaluate a trace saved by an earlier run instead of running the simulation, only the evaluation and parameters files are read')
+    parser.add_argument('--verbose',type=int,default=0,help='logging level of the network, 0 to 2')
+    parser.add_argument('--quiet',action='store_true',help='do not print the progress of the simulation')
+    return parser.parse_args(argv)
+
+#read the input files in the same way as the GUI, returns None and prints the reason if a file is missing
+def read_inputs(arguments):
+    paths = {'nodes':arguments.nodes,'edges':arguments.edges,'schedule':arguments.schedule,'parameters':arguments.parameters,'eval':arguments.eval,'scenario':arguments.scenario}
+    if arguments.segments!='':
+        paths['segments'] = arguments.segments
+    for name,file_path in paths.items():
+        if os.path.isfile(file_path)==False:
+            print(file_path,' is not a valid file')
+            return None
+    inputs = {name:pd.read_csv(file_path,thousands=r',') for name,file_path in paths.items() if name!='segments'}
+    if arguments.segments!='':
+        inputs['segments'] = pd.read_csv(arguments.segments,thousands=r',',keep_default_na=False) #keep_default_na false so that empty values in a column are kept as empty strings
+        inputs['schedule_type'] = 'complex'
+    else:
+        inputs['segments'] = '' #we don't need the schedule segments file in simple scheduling
+        inputs['schedule_type'] = 'simple'
+    inputs['demand_stream'] = None
+    if arguments.demand_stream is not None:
+        if os.path.isfile(arguments.demand_stream)==False:
+            print(arguments.demand_stream,' is not a valid file')
+            return None
+        inputs['demand_stream'] = demand.load_demand_stream(arguments.demand_stream)
+        if inputs['demand_stream'].num_nodes!=len(inputs['nodes']):
+            print('demand stream ',arguments.demand_stream,' has ',inputs['demand_stream'].num_nodes,' nodes but ',arguments.nodes,' has ',len(inputs['nodes']))
+            return None
+    return inputs
+
+#evaluate the logs of a saved trace and write the results, returns 0 on success and 1 on failure
+def evaluate_trace(arguments):
+    for file_path in (arguments.eval,arguments.parameters):
+        if os.path.isfile(file_path)==False:
+            print(file_path,' is not a valid file')
+            return 1
+    if simulation_trace.is_trace(arguments.load_trace)==False:
+        return 1
+    os.makedirs(arguments.output_dir,exist_ok=True)
+    time1 = time.time()
+    trace = simulation_trace.open_trace(arguments.load_trace)
+    sim_times,sim_vehicle_latitudes,sim_vehicle_longitudes,sim_vehicle_names,sim_vehicle_passengers,sim_node_passengers,num_failed_passengers,num_successful_passengers,sim_time_taken = trace.simulation_results()
+    evaluator = e.Evaluator(pd.read_csv(arguments.eval,thousands=r','),pd.read_csv(arguments.parameters,thousands=r','))
+    evaluation_message = evaluator.evaluate(sim_times,sim_vehicle_passengers,sim_node_passengers,num_failed_passengers,num_successful_passengers)
+    time2 = time.time()
+    summary = {'num_failed_passengers':int(num_failed_passengers),'num_successful_passengers':int(num_successful_passengers),'simulated_minutes':float(sim_time_taken),
+               'trace_complete':trace.complete,'evaluation_seconds':time2-time1,'arguments':vars(arguments)}
+    write_results(arguments.output_dir,evaluation_message,summary)
+    return 0
+
+#write the evaluation and the summary of a run to the output directory
+def write_results(output_dir,evaluation_message,summary):
+    with open(os.path.join(output_dir,'evaluation.txt'),'w') as evaluation_file:
+        evaluation_file.write(evaluation_message)
+    with open(os.path.join(output_dir,'summary.json'),'w') as summary_file:
+        json.dump(summary,summary_file,indent=2)
+    print(evaluation_message)
+    print('results written to ',output_dir)
+
+#build the network, run the simulation and evaluator, and write the results, returns 0 on success and 1 on failure
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    if arguments.load_trace is not None:
+        return evaluate_trace(arguments)
+    inputs = read_inputs(arguments)
+    if inputs is None:
+        return 1
+    os.makedirs(arguments.output_dir,exist_ok=True)
+    with contextlib.ExitStack() as stack:
+        if arguments.quiet:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull,'w')))) #closed again even if the simulation raises
+        time1 = time.time()
+        network = n.Network(nodes_csv=inputs['nodes'],edges_csv=inputs['edges'],schedule_csv=inputs['schedule'],parameters_csv=inputs['parameters'],eval_csv=inputs['eval'],
+                            scenario_csv=inputs['scenario'],verbose=arguments.verbose,segment_csv=inputs['segments'],schedule_type=inputs['schedule_type'],optimiser=arguments.optimiser,
+                            routing_engine=arguments.routing_engine,max_transfers=arguments.max_transfers,demand_seed=arguments.demand_seed,demand_stream=inputs['demand_stream'],cohorts=arguments.cohorts)
+        if arguments.stop_time is not None:
+            network.stop_simulation_time = arguments.stop_time
+        time2 = time.time()
+        trace_path = os.path.join(arguments.output_dir,'trace') if arguments.trace else None
+        if arguments.sim=='event':
+            results = network.event_sim(trace_path=trace_path)
+        else:
+            results = network.basic_sim(trace_path=trace_path)
+        time3 = time.time()
+    sim_times,sim_vehicle_latitudes,sim_vehicle_longitudes,sim_vehicle_names,sim_vehicle_passengers,sim_node_passengers,num_failed_passengers,num_successful_passengers,sim_time_taken = results
+    evaluator = e.Evaluator(inputs['eval'],inputs['parameters'])
+    evaluation_message = evaluator.evaluate(sim_times,sim_vehicle_passengers,sim_node_passengers,num_failed_passengers,num_successful_passengers)
+    time4 = time.time()
+    #write the results
+    if trace_path is None:
+        network.recorder.save(os.path.join(arguments.output_dir,'logs.npz')) #with a trace the logs are already on disk
+    summary = {'num_failed_passengers':int(num_failed_passengers),'num_successful_passengers':int(num_successful_passengers),'simulated_minutes':float(sim_time_taken),
+               'setup_seconds':time2-time1,'simulation_seconds':time3-time2,'evaluation_seconds':time4-time3,'arguments':vars(arguments)}
+    write_results(arguments.output_dir,evaluation_message,summary)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
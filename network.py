@@ -6,10 +6,25 @@ import numpy as np #for large scale mathematical operations
 import time as time #for benchmarking
 import schedule as schedule
 import vehicle as vehicle
-import copy as copy #for shallow-copying schedules
+import fleet as fleet
+import recorder as recorder
+import simulation_trace as simulation_trace
+import copy as copy #for copying segments when building complex schedules
+import heapq as heapq #for priority queues used in pathfinding
+import collections as collections #for the queues of agents waiting at nodes
 import random as rand
 rand.seed(30699) #consistent seed to ensure consistent results
 import agent as a
+import registry as registry
+import timetable as timetable
+import connection_scan as connection_scan
+import raptor as raptor
+import demand as demand
+
+#kinds of event in the event driven simulation, events at the same time are processed in this order, matching the order of Network.update_time
+#vehicles are dispatched from the network's dispatch queue, between vehicles stopping and passengers being created
+VEHICLE_STOP_EVENT = 0 #a vehicle stops at a node, passengers may alight and board
+DEMAND_EVENT = 1 #passengers are created
 
 #edge class, represents a (one-way) link between two nodes
 #at the moment, only relevant property is travel time taken, but more properties may be added later
@@ -38,19 +53,23 @@ class Edge:
 #node class, represents a location between which passengers can travel
 #the node stores the names of all the nodes which start at it
 class Node:
-    __slots__ = ("name","edge_names","edge_destinations","edge_times","latitude","longitude","agents","schedule_names","schedule_times","nodes_after","node_times_after","id","network",
-                 "next_vehicle_changed","num_agents","next_service_times","num_nodes_in_network","distance_to_nodes","evaluated_nodes","evaluated_nodes_tf","path_to_nodes")
+    __slots__ = ("name","edge_registry","edge_names","edge_destination_registry","edge_destinations","edge_times","latitude","longitude","boarding_queues","cohorts","schedule_ids","stop_indices","stop_ends","id","network",
+                 "next_vehicle_changed","num_agents","next_service_times","num_nodes_in_network","distance_to_nodes","evaluated_nodes","pathfinding_heap","parent_nodes","parent_schedules"
+                 ,"departure_times","departure_keys","departure_ends","departure_cursors","departure_key_offsets","departure_low","departure_high")
     def __init__(self,name,coordinates,id,network):
         self.name = name
-        self.edge_names = []#list of all edges starting at this node
-        self.edge_destinations = []#and the destination of each node
+        self.edge_registry = registry.NameRegistry() #lookup of the index of an edge by name
+        self.edge_names = self.edge_registry.names #list of all edges starting at this node
+        self.edge_destination_registry = registry.NameRegistry() #lookup of the index of an edge by destination name
+        self.edge_destinations = self.edge_destination_registry.names #and the destination of each node
         self.edge_times = []#matching list of travel time of each respective edge
         (self.latitude,self.longitude) = extract_coordinates(coordinates)
-        self.agents = [] #list of all agents at this stations
-        self.schedule_names = [] #list of schedules stopping at this station
-        self.schedule_times = [] #times at which vehicles arrive at this node
-        self.nodes_after = [] #list of nodes after this node on a schedule
-        self.node_times_after = [] #time to reach nodes after the node on the schedule
+        self.boarding_queues = {} #queues of the indices of agents at this station (in the network's agent store), keyed by the id of the schedule they are waiting for
+        self.cohorts = {} if network.cohorts==True else None #in cohort mode, the waiting agent with each origin and remaining path, keyed by schedule id and then by agent.AgentStore.cohort_key
+        #the schedules stopping at this station are read from the network's timetable by compile_departures
+        self.schedule_ids = [] #index in the network's timetable of schedules stopping at this station
+        self.stop_indices = [] #index of this station's stop in the timetable's flat stop arrays, for each schedule
+        self.stop_ends = [] #index after the last stop of each schedule, the nodes after this station are the stops between the two
         self.id = id #id of the node
         self.network = network #network we belong too
         #has the next vehicle of each schedule arriving at the node changed since we lasted found paths
@@ -60,8 +79,8 @@ class Node:
     #add an edge which starts at the node
     def add_edge(self,edge):
         if edge.start_node == self.name:#the edge will be stored with this node only if it starts at the node        
-            self.edge_names.append(edge.name)
-            self.edge_destinations.append(edge.end_node)
+            self.edge_registry.add(edge.name)
+            self.edge_destination_registry.add(edge.end_node)
             self.edge_times.append(edge.travel_time)
             return True#Return true to indicate edge has been associated with the node
         else:
@@ -71,13 +90,12 @@ class Node:
     #return the time taken to travel along a particular edge
     #for this function to work correctly, edge names must be unique
     def provide_edge_time(self,edge_name):
-        try: 
-            edge_index = self.edge_names.index(edge_name)
-            time_taken = self.edge_times[edge_index]
-            return (True,time_taken) #True to indicate search operation was successful
-        except ValueError: #edge name not in list of provided eges
+        edge_index = self.edge_registry.index(edge_name)
+        if edge_index==-1: #edge name not in list of provided eges
             print('edge ', edge_name, ' not in list of edges starting at this node')
             return False #False to indicate search operation unsuccessful 
+        time_taken = self.edge_times[edge_index]
+        return (True,time_taken) #True to indicate search operation was successful
 
     #return the time taken to travel to all neighbouring nodes and the names of the destination 
     def provide_nodes_time(self):
@@ -90,25 +108,52 @@ class Node:
     #return the time taken to travel to a destination as well as the edge to reach it
     #for this function to work correctly, edge names must be unique
     def provide_node_time(self,destination_name):
-        try: 
-            node_index = self.edge_destinations.index(destination_name)
-            time_taken = self.edge_times[node_index]
-            edge_taken = self.edge_names[node_index]
-            return (True,time_taken,edge_taken) #True to indicate search operation was successful
-        except ValueError: #destination name not in list of provided nodes
+        node_index = self.edge_destination_registry.index(destination_name)
+        if node_index==-1: #destination name not in list of provided nodes
             print('node ', destination_name, ' not in list of nodes reachable from this node')
             return False #False to indicate search operation unsuccessful
+        time_taken = self.edge_times[node_index]
+        edge_taken = self.edge_names[node_index]
+        return (True,time_taken,edge_taken) #True to indicate search operation was successful
     
-    #add a agent to the station
-    def add_agent(self,agent):
-        self.agents.append(agent)
-        self.num_agents = self.num_agents + agent.number_passengers #the number of passengers has increased
-
-    #remove agent from the station
-    def remove_agent(self,id):
-        removed_agent = self.agents.pop(id)
-        self.num_agents = self.num_agents - removed_agent.number_passengers #the number of passengers has decreased
-        return removed_agent
+    #add a agent to the station, at the back of the queue for the schedule it will board next
+    #in cohort mode, if an agent with the same remaining path is already waiting the two are merged, returns the index of the agent now waiting
+    def add_agent(self,agent_index):
+        agents = self.network.agents
+        schedule_id = agents.next_step(agent_index)
+        queue = self.boarding_queues.get(schedule_id)
+        if queue is None:
+            queue = collections.deque()
+            self.boarding_queues[schedule_id] = queue
+        self.num_agents = self.num_agents + int(agents.number_passengers[agent_index]) #the number of passengers has increased
+        if self.network.cohorts==True:
+            cohorts = self.cohorts.setdefault(schedule_id,{})
+            cohort_key = agents.cohort_key(agent_index)
+            cohort_index = cohorts.get(cohort_key)
+            if cohort_index is not None:
+                return agents.merge(cohort_index,agent_index) #join the agent already waiting, keeping its place in the queue
+            cohorts[cohort_key] = agent_index
+        queue.append(agent_index)
+        return agent_index
+
+    #provide the queue of agents waiting for a schedule, None if no agents have waited for it
+    def boarding_queue(self,schedule_id):
+        return self.boarding_queues.get(schedule_id)
+
+    #remove the agent at the front of the queue for a schedule from the station
+    def remove_next_agent(self,schedule_id):
+        removed_agent_index = self.boarding_queues[schedule_id].popleft()
+        self.num_agents = self.num_agents - int(self.network.agents.number_passengers[removed_agent_index]) #the number of passengers has decreased
+        if self.network.cohorts==True:
+            del self.cohorts[schedule_id][self.network.agents.cohort_key(removed_agent_index)] #the agent is no longer waiting here
+        return removed_agent_index
+
+    #split the passengers who will board off the agent at the front of the queue for a schedule, returns the index of the new agent which boards
+    #the rest of the agent keeps its place in the queue, and the station's passenger count drops by the passengers who left
+    def split_next_agent(self,schedule_id,number_passengers):
+        split_agent_index = self.network.agents.split(self.boarding_queues[schedule_id][0],number_passengers)
+        self.num_agents = self.num_agents - number_passengers
+        return split_agent_index
 
 
     #count the number of agents at the station
@@ -119,124 +164,139 @@ class Node:
         return self.num_agents 
 
 
-    #add a schedule which stops at that station
-    def add_stopping_schedule(self,schedule_name,schedule_times,node_offset,nodes_after,node_times_after):
-        self.schedule_names.append(schedule_name)
-        schedule_times_mod = [schedule_time+node_offset for schedule_time in schedule_times] #offset schedule times by time to reach the node
-        self.schedule_times.append(schedule_times_mod)
-        self.nodes_after.append(nodes_after)
-        self.node_times_after.append(node_times_after)
+    #read the schedules which stop at the station from the timetable, and store the times at which each arrives at the node in a single sorted array
+    #so that the next service of every schedule can be found with one binary search
+    #schedule i's services are searched as departure_times + i*span, so that the services of all schedules form one sorted array of keys
+    #each schedule's services are followed by an infinite time, which is what is found once a schedule has no services left
+    def compile_departures(self,timetable):
+        schedule_ids,positions = timetable.schedules_at_node(self.id)
+        stop_indices = timetable.stop_offsets[schedule_ids]+positions
+        self.schedule_ids = schedule_ids.tolist()
+        self.stop_indices = stop_indices.tolist()
+        self.stop_ends = timetable.stop_offsets[schedule_ids+1].tolist()
+        num_schedules = len(self.schedule_ids)
+        #offset the departure times of each schedule by the time taken to reach the node
+        schedule_times = [np.sort(timetable.schedule_departures(schedule_id)+timetable.stop_times[stop_index]) for schedule_id,stop_index in zip(self.schedule_ids,self.stop_indices)]
+        lengths = np.array([len(times) for times in schedule_times],dtype=np.int64)
+        self.departure_ends = np.cumsum(lengths+1)-1 #index of the infinite time after each schedule's services
+        self.departure_cursors = self.departure_ends-lengths #index of the first service of each schedule which has not yet arrived, this only ever advances
+        if np.sum(lengths)>0:
+            all_times = np.concatenate(schedule_times)
+            self.departure_low = float(np.min(all_times)-1) #queries are clamped to this range, which doesn't change their result
+            self.departure_high = float(np.max(all_times)+1)
+        else:
+            self.departure_low = 0.0
+            self.departure_high = 1.0
+        span = self.departure_high-self.departure_low+2 #gap between the keys of successive schedules, large enough that they never overlap
+        self.departure_key_offsets = np.arange(num_schedules)*span
+        self.departure_times = np.zeros(np.sum(lengths+1))
+        self.departure_keys = np.zeros(np.sum(lengths+1))
+        for i in range(num_schedules):
+            start = self.departure_cursors[i]
+            end = self.departure_ends[i]
+            self.departure_times[start:end] = schedule_times[i]
+            self.departure_times[end] = np.inf
+            self.departure_keys[start:end+1] = np.append(schedule_times[i],self.departure_high) + self.departure_key_offsets[i]
 
     #calculate the time till the next service of each schedule arrives at a node
     def time_till_next_vehicles(self,current_time):
-        num_schedules = len(self.schedule_names)
-        next_service_times = []
-        for i in range(num_schedules): #go through all the schedules at a node
-            #calculate service data for each particular schedule
-            schedule_times = self.schedule_times[i]
-            num_future_services = len(schedule_times)
-            j = 0 #which service are we looking at
-            next_service_time = np.inf #default next service time is infinity
-            while j<num_future_services:
-                service_time = schedule_times[j]
-                if service_time>=current_time:
-                    next_service_time = service_time
-                    break #we have found a service after (or equal) to the present time, so need to search further
-                j = j + 1 #look at the next service
-            next_service_times.append(next_service_time)
-
-        return next_service_times            
+        query_keys = min(max(current_time,self.departure_low),self.departure_high) + self.departure_key_offsets
+        next_services = self.departure_keys.searchsorted(query_keys,side='left') #first service at or after the current time, or the infinite time if there is none
+        np.maximum(next_services,self.departure_cursors,out=next_services) #ignore services which have already arrived
+        return self.departure_times[next_services].tolist()
 
     #remove vehicles which have already arrived at the node
     def remove_arrived_vehicles(self,current_time):
-        num_schedules = len(self.schedule_names)
-        for i in range(num_schedules): #go through all the schedules at a node
-            while len(self.schedule_times[i])>0:
-                if self.schedule_times[i][0]<=current_time: #if this service is in the past
-                    self.schedule_times[i].pop(0) #remove it from the list of services
-                else:
-                    break #as services of a schedule are in order, we only need to evaluate till we find a service in the future
-    
+        query_keys = min(max(current_time,self.departure_low),self.departure_high-1) + self.departure_key_offsets
+        arrived_services = self.departure_keys.searchsorted(query_keys,side='right') #first service after the current time
+        np.maximum(self.departure_cursors,arrived_services,out=self.departure_cursors) #as services of a schedule are in order, everything before this has arrived
+
     #reset the internal info required for pathfinding 
     def reset_pathfinding_info(self):
         self.num_nodes_in_network = len(self.network.node_names)
-        self.distance_to_nodes = np.zeros(self.num_nodes_in_network) + np.inf #initial distance to reach all other nodes will be infinite
-        self.evaluated_nodes = np.zeros(self.num_nodes_in_network)  #when a node is evaluated the value in this matrix is set to infinite, ensuring that node is never evaluated again
-        self.evaluated_nodes_tf = np.zeros(self.num_nodes_in_network) #as above, but evaluated nodes are set to 1
+        self.distance_to_nodes = [np.inf]*self.num_nodes_in_network #initial distance to reach all other nodes will be infinite
+        self.evaluated_nodes = np.zeros(self.num_nodes_in_network,dtype=bool)  #when a node is evaluated the value in this array is set to true, ensuring that node is never evaluated again
         self.distance_to_nodes[self.id] = 0 #initial distance to reach the starting node is 0
-        #create an array to store the paths to all the other nodes       
-        self.path_to_nodes = [[] for _ in range(self.num_nodes_in_network)] #create an empty nested list of the required length to store paths to nodes
+        self.pathfinding_heap = [(0,self.id)] #heap of (distance,node index) of nodes which may be evaluated next
+        #rather than storing the full path to every node, store the node and schedule we arrived from, paths are rebuilt from these when needed
+        self.parent_nodes = [-1]*self.num_nodes_in_network #node we boarded at to reach each node, -1 if the node has not been reached (or is the start)
+        self.parent_schedules = [-1]*self.num_nodes_in_network #schedule we rode to reach each node
 
     def check_evaluated_destinations(self,destination_nodes):
         num_evaluated_destinations = np.sum(np.logical_and(self.evaluated_nodes,destination_nodes)) 
         return num_evaluated_destinations
 
     #find a path from this node to all nodes where num_passengers_to_node is greater than 0
+    #nodes are evaluated in order of earliest arrival using a binary heap, so each search costs O(E log N) rather than O(N^2)
+    #the search state is kept between calls, so if the next vehicle at this node has not changed the search continues where it left off
     def find_paths(self,num_passengers_to_node,start_time):
         if self.next_vehicle_changed == True:
             self.reset_pathfinding_info() #restart the pathfinding process if the next vehicle arriving at this node has changed
             self.next_vehicle_changed = False #compared to the present, next vehicle has not changed
          #get info about vehicles arriving at the starting node
-        start_next_service_times,start_nodes_after,start_node_times_after,start_schedule_names = self.provide_next_services(data_time=start_time,start=True)
+        start_next_service_times,start_stop_indices,start_stop_ends,start_schedule_ids = self.provide_next_services(data_time=start_time,start=True)
+        stop_nodes = self.network.timetable.stop_node_list #the stops of every schedule, the nodes after a station are read from here
+        stop_times = self.network.timetable.stop_time_list
         destination_nodes = num_passengers_to_node>0 #determine which nodes we need to calculate paths too (I.E those where passengers are actually going)
         num_destinations = np.sum(destination_nodes) #number of destinations we are trying to reach     
         num_evaluated_destinations = self.check_evaluated_destinations(destination_nodes) #get number of destinations already evaluated
-        while True: #loop till we meet an exit conditionx
-            expected_distance_to_nodes = self.distance_to_nodes + self.evaluated_nodes #set the distance to reach an already evaluated node to be infinite so we don't choose it as the minimal node
-            min_index = np.argmin(expected_distance_to_nodes) #get the index of the node with the lowest expected travel time, evaluate this next
-            minimum_distance = expected_distance_to_nodes[min_index] #extract the minimum distance from the starting node
-            if minimum_distance == np.inf:
+        distance_to_nodes = self.distance_to_nodes
+        evaluated_nodes = self.evaluated_nodes
+        heap = self.pathfinding_heap
+        parent_nodes = self.parent_nodes
+        parent_schedules = self.parent_schedules
+        while True: #loop till we meet an exit condition
+            while len(heap)>0 and evaluated_nodes[heap[0][1]]:
+                heapq.heappop(heap) #discard outdated entries for nodes which have already been evaluated
+            if len(heap)==0:
                 break #break out of the loop, we have explored all the network we can reach      
             elif num_evaluated_destinations==num_destinations:
                 break #break out of the loop, we have already found paths to all the destinations we wish to reach
-            else:
-                #otherwise, explore paths from the minimal node
-                current_time = minimum_distance +  start_time#time at which we reach the node currently being evaluated
-                if min_index==self.id: #if at starting node, use precalcuated data about services
-                    #use precalculated data from the starting node
-                    next_service_times = start_next_service_times
-                    nodes_after = start_nodes_after
-                    times_after = start_node_times_after
-                    schedule_names = start_schedule_names
-                else: #otherwise, extract data about the evaluation node at the evaluation time
-                    next_service_times,nodes_after,times_after,schedule_names = self.network.nodes[min_index].provide_next_services(start=False,data_time=current_time)
-
+            #otherwise, explore paths from the node with the lowest expected travel time
+            minimum_distance,min_index = heapq.heappop(heap)
+            current_time = minimum_distance +  start_time#time at which we reach the node currently being evaluated
+            if min_index==self.id: #if at starting node, use precalcuated data about services
+                #use precalculated data from the starting node
+                next_service_times = start_next_service_times
+                stop_indices = start_stop_indices
+                stop_ends = start_stop_ends
+                schedule_ids = start_schedule_ids
+            else: #otherwise, extract data about the evaluation node at the evaluation time
+                next_service_times,stop_indices,stop_ends,schedule_ids = self.network.nodes[min_index].provide_next_services(start=False,data_time=current_time)
 
             #now it's time to calculate the path to other nodes
             num_schedules = len(next_service_times)
             for i in range(num_schedules):
-                #extract nodes and times after for this specific route            
+                #the nodes after the evaluation node on this route are the stops after it in the timetable
                 next_service_time = next_service_times[i]
-                next_service_name = schedule_names[i]
-                route_nodes_after = nodes_after[i]
-                route_times_after = times_after[i]
-                for j,node in enumerate(route_nodes_after):
-                    node_index = node.id
-                    distance_to_current_node_old_path = self.distance_to_nodes[node_index] #what is the current shortest path to the node we are looking at
-                    distance_to_current_node_new_path = minimum_distance + (next_service_time-current_time) + route_times_after[j] #how long to reach next node through evaluation node
-                    if distance_to_current_node_new_path<distance_to_current_node_old_path: #we have a better path
-                        self.distance_to_nodes[node_index] = distance_to_current_node_new_path
-                        route_to_old_node = self.path_to_nodes[min_index] #extract the path to the evaluation node
-                        route_to_new_node = copy.copy(route_to_old_node) #path to the next node is path to the evaluation node + new step
-                        route_to_new_node.append(next_service_name) #store the next service we need to catch
-                        route_to_new_node.append(node.name) #and when we need to get off that service
-                        self.path_to_nodes[node_index] = route_to_new_node #store this in the list of all paths
+                if next_service_time==np.inf:
+                    continue #no more services of this schedule will arrive, so it cannot provide a better path
+                next_service_id = schedule_ids[i]
+                stop_time = stop_times[stop_indices[i]] #time to reach the evaluation node from the start of the schedule
+                for k in range(stop_indices[i]+1,stop_ends[i]):
+                    node_index = stop_nodes[k]
+                    distance_to_current_node_new_path = minimum_distance + (next_service_time-current_time) + (stop_times[k]-stop_time) #how long to reach next node through evaluation node
+                    if distance_to_current_node_new_path<distance_to_nodes[node_index]: #we have a better path
+                        distance_to_nodes[node_index] = distance_to_current_node_new_path
+                        parent_nodes[node_index] = min_index #we reach the next node by boarding at the evaluation node
+                        parent_schedules[node_index] = next_service_id #and catching this schedule
+                        heapq.heappush(heap,(distance_to_current_node_new_path,node_index))
             
-            self.evaluated_nodes[min_index] = np.inf #mark the node as evaluated, it will not be evaluated again
-            self.evaluated_nodes_tf[min_index] = True #as above
+            evaluated_nodes[min_index] = True #mark the node as evaluated, it will not be evaluated again
             if destination_nodes[min_index]==True:
                 num_evaluated_destinations = num_evaluated_destinations+1
 
-        #once we have found the paths to all nodes, return the paths and number of passengers
+        #once we have found the paths to all nodes, return the number of passengers, paths can then be built with build_path
         #note we return the number of passengers going to an unreachable station as zero, but we return the number of passengers who failed to reach their destination as well
-        num_nodes = len(self.network.nodes)
-        num_unreachable_passengers = 0 #keep track of the number of passengers who fail to reach their destination
-        for i in range(num_nodes):
-            if self.distance_to_nodes[i]==np.inf: #if the passenger cannot reach this node
-                num_unreachable_passengers = num_unreachable_passengers + num_passengers_to_node[i] #add them to the total of failed passengers
-                num_passengers_to_node[i] = 0 #do not create any passengers trying to reach this node
+        unreachable_nodes = np.isinf(distance_to_nodes) #the passenger cannot reach these nodes
+        num_unreachable_passengers = np.sum(num_passengers_to_node[unreachable_nodes]) #add them to the total of failed passengers
+        num_passengers_to_node[unreachable_nodes] = 0 #do not create any passengers trying to reach this node
     
-        return self.path_to_nodes,num_passengers_to_node,num_unreachable_passengers
+        return num_passengers_to_node,num_unreachable_passengers
+
+    #build the path from this node to a destination found by the last call to find_paths
+    def build_path(self,destination_index):
+        return a.build_path_from_parents(self.parent_nodes,self.parent_schedules,destination_index)
         
 
     #as previous function, but store the result in a internal variable
@@ -252,8 +312,8 @@ class Node:
         else:
             #otherwise calculate the time dynamically
             next_service_times = self.time_till_next_vehicles(data_time)
-        #in either case, we must return the corresponding following nodes and their time to reach
-        return next_service_times,self.nodes_after,self.node_times_after,self.schedule_names
+        #in either case, we must return where each schedule's following stops are found in the timetable
+        return next_service_times,self.stop_indices,self.stop_ends,self.schedule_ids
 
     def test_node(self):
         print('from node ',self.name, ' edges are')
@@ -266,27 +326,41 @@ class Node:
 class Network:
     #initalise the physical network
     #note, this assumes that passengers are evenly distributed through the day
-    __slots__ = ("verbose","edges","nodes","edge_names","optimiser","node_names","edge_starts","edge_ends","edge_times","edge_bidirectional","vehicle_max_seated","vehicle_max_standing","traffic_time_gap"
+    __slots__ = ("verbose","edges","nodes","edge_registry","edge_names","optimiser","node_registry","node_names","edge_starts","edge_ends","edge_times","edge_bidirectional","vehicle_max_seated","vehicle_max_standing","traffic_time_gap"
                  ,"traffic_multiplier","stop_simulation_time","vehicle_cost","agent_cost_seated","agent_cost_standing","agent_cost_waiting","unfinished_penalty","passenger_time_multiplier"
-                 ,"segment_csv","schedule_csv","schedule_type","node_passengers","parameters_csv","num_vehicles_started_here","vehicles","vehicle_names","time","agents","agent_ids","agent_id_counter"
-                 ,"num_failed_agents","num_successful_agents","distance_to_all","paths_to_all","origin_destination_trips","edge_traffic","schedule_names","schedule_gaps","schedule_offsets","schedule_finish"
-                 ,"schedules","dispatch_schedule2","times","vehicle_latitudes","vehicle_longitudes","store_vehicle_names","vehicle_passengers")
+                 ,"segment_csv","schedule_csv","schedule_type","node_passengers","parameters_csv","num_vehicles_started_here","vehicles","vehicle_names","time","agents","trip_records"
+                 ,"num_failed_agents","num_successful_agents","distance_to_all","predecessor_edges","origin_destination_trips","edge_traffic","schedule_names","schedule_gaps","schedule_offsets","schedule_finish"
+                 ,"schedules","dispatch_schedule2","dispatch_queue","timetable","times","vehicle_latitudes","vehicle_longitudes","store_vehicle_names","vehicle_passengers"
+                 ,"adjacency_offsets","adjacency_destinations","adjacency_times","adjacency_edges","edge_start_indices","path_depths","path_levels"
+                 ,"routing_engine","connection_scan","max_transfers","raptor","demand_rng","demand_stream","cohorts","fleet","recorder")
 
-    def __init__(self,nodes_csv,edges_csv,schedule_csv,parameters_csv,eval_csv,scenario_csv,verbose=1,segment_csv='',schedule_type='simple',optimiser='hardcoded'):
+    def __init__(self,nodes_csv,edges_csv,schedule_csv,parameters_csv,eval_csv,scenario_csv,verbose=1,segment_csv='',schedule_type='simple',optimiser='hardcoded',routing_engine='dijkstra',max_transfers=None,demand_seed=30699,demand_stream=None,cohorts=False):
         time1 = time.time()
         print('optimiser ',optimiser)
         self.verbose = verbose #import verbosity
         #where we will store edges and nodes
         self.edges = [] #list of edges 
         self.nodes = [] #list of nodes
-        self.edge_names = [] #list of generated edge names
+        self.edge_registry = registry.NameRegistry() #lookup of the index of an edge by name
+        self.edge_names = self.edge_registry.names #list of generated edge names
+        #routing engine used to find passenger paths, options are "dijkstra", the time-dependent search from each node, "csa", a connection scan over the whole timetable
+        #and "raptor", a round based search which finds the fastest journey using at most max_transfers transfers (None for no limit)
+        if routing_engine not in ('dijkstra','csa','raptor'):
+            print('routing engine ',routing_engine,' not recognised, using dijkstra')
+            routing_engine = 'dijkstra'
+        self.routing_engine = routing_engine
+        self.max_transfers = max_transfers
         self.optimiser = optimiser #optimisers we can use, options are "hardcoded", the set frequency from the schedule and "henryconvex", my own custom convex optimisation function 
         #extract the raw data
         #now extract node data
-        self.node_names = nodes_csv["Name"].to_list()
+        self.node_registry = registry.NameRegistry(nodes_csv["Name"].to_list()) #lookup of the index of a node by name
+        self.node_names = self.node_registry.names
         node_positions = nodes_csv["Location"].to_list() 
         #and let's create the nodes
         num_nodes = len(self.node_names)
+        #in cohort mode agents with the same origin and remaining path at the same node or in the same vehicle are merged into one agent, and are only split when a vehicle is too full to take them all
+        #this keeps the number of agents near the number of distinct paths in use, at the cost of mixing the queue position and start time of merged passengers
+        self.cohorts = cohorts
         for i in range(num_nodes):
             self.nodes.append(Node(self.node_names[i],node_positions[i],i,self)) #nodes id is it's position in the array
 
@@ -318,6 +392,8 @@ class Network:
         self.agent_cost_waiting = eval_csv["Agent Cost Waiting"].to_list()[0] #marginal value of agents time, higher because waiting is unpleasant $/hr
         self.unfinished_penalty = eval_csv["Unfinished Penalty"].to_list()[0] #penalty if passengers are unable to reach their destination, based roughly on cost of late night taxi ride
         self.passenger_time_multiplier = float(0) #multiplier on how many passengers are generated per hour, converted to a float as it refuses to become an integer later
+        self.demand_rng = np.random.default_rng(demand_seed) #seeded generator used to draw the number of passengers created, so runs are reproducible
+        self.demand_stream = demand_stream #if provided, a pre-sampled demand.DemandStream which passengers are created from instead of drawing them each minute
         #allocate passengers 
         self.node_passengers = (nodes_csv["Daily Passengers"]).to_list()#passengers per day for each station
         time2 = time.time()
@@ -351,10 +427,9 @@ class Network:
         self.vehicle_names = [] #container to store vehicle names in, note this is just schedule name followed by initial departure time 
         #set the simulation timestamp to be 0 (start of simulation)
         self.time = 0
-        #containers to store agents (passengers) and agent ids
-        self.agents = []
-        self.agent_ids = []
-        self.agent_id_counter = 0 #id of the next agent to be generated
+        #store of all agents (passengers), an agent's id is its index in the store
+        self.agents = a.AgentStore()
+        self.trip_records = a.TripRecords() #trips of agents who have reached their destination, kept after the agents are released
         self.num_failed_agents = 0 #number of agents created who could not find a path and hence were immediately unmade
         self.num_successful_agents = 0 #number of agents who were created and found a path to their destination
         time1 = time.time()
@@ -406,91 +481,92 @@ class Network:
 
     #update the passenger time multiplier, sets the number of passengers generated to vary throughout the day based on the scenario    
     def update_passenger_time_multiplier(self):
-        time_period = int(self.time/self.traffic_time_gap)
-        time_period_start = time_period*self.traffic_time_gap  
-        if self.time<self.stop_simulation_time:
-            end_time_multiplier = self.traffic_multiplier[time_period+1]
-            start_time_multiplier = self.traffic_multiplier[time_period]
-        else:
-            end_time_multiplier = 0
-            start_time_multiplier = 0
-        
-        time_from_start = self.time-time_period_start
-        self.passenger_time_multiplier = start_time_multiplier*(1-time_from_start/self.traffic_time_gap) + end_time_multiplier*(time_from_start/self.traffic_time_gap)
-        self.passenger_time_multiplier = self.passenger_time_multiplier
+        self.passenger_time_multiplier = demand.interpolate_time_multiplier(self.time,self.traffic_multiplier,self.traffic_time_gap,self.stop_simulation_time)
+
+    #sample the passengers created over the whole day, this can be saved and replayed across runs with different schedules by passing it as demand_stream
+    def sample_demand_stream(self,seed=30699):
+        return demand.sample_demand_stream(self.origin_destination_trips,self.traffic_multiplier,self.traffic_time_gap,self.stop_simulation_time,seed=seed)
 
     #create a new vehicle and add it to the network
     def create_vehicle(self,schedule):
         vehicle_name = str(self.time) + " " + schedule.provide_name() #calculate the vehicles name
-        #produce a shallow copy of the schedule to provide to the vehicle, note we use a class defined implemention of shallow-copying
-        copy_schedule = copy.copy(schedule) #copy the schedule object, but maintain keep references to node/edges identical
+        #the schedule is shared by all of its vehicles, so it is not copied
         if self.verbose>=1:
-            print('schedule destinations ',copy_schedule.nodes)
-        junk,start_node = copy_schedule.provide_next_destination() #extract the first destination of the schedule
+            print('schedule destinations ',schedule.nodes)
+        junk,start_node,junk_edge = schedule.provide_stop(0) #extract the first destination of the schedule
         start_node_index = start_node.id
         self.num_vehicles_started_here[start_node_index] += 1 #record that a vehicle started at a particular node
-        self.vehicle_names.append(vehicle_name) #add the vehicles name to the list
-        self.vehicles.append(vehicle.Vehicle(copy_schedule,self.time,vehicle_name,seated_capacity=self.vehicle_max_seated,standing_capacity=self.vehicle_max_standing)) #create the vehicle and add it to the list
+        self.vehicle_names.append(vehicle_name) #add the vehicles name to the list, the vehicle's id is the index of its name
+        vehicle.Vehicle(schedule,self.time,vehicle_name,len(self.vehicle_names)-1,seated_capacity=self.vehicle_max_seated,standing_capacity=self.vehicle_max_standing,agent_store=self.agents,cohorts=self.cohorts,fleet=self.fleet) #create the vehicle, which adds itself to the fleet and so to self.vehicles
         if self.verbose>=1:
             print('a vehicle ', vehicle_name, ' has been created at ',start_node.name, ' at time ',self.time)
 
     #this function updates all the vehicle objects in the network
+    #all vehicles are moved at once by the fleet, which removes the vehicles which have reached their destination
     def move_vehicles(self):
-        for count,vehicle in enumerate(self.vehicles):
-            #logging
-            if self.verbose==1:
-                vehicle.verbose_stop()
-            elif self.verbose>=2:
-                vehicle.verbose_position()
-            not_reached_destination = vehicle.update()  
-            if not_reached_destination == False:
-                if self.verbose>=1:
-                    print('a vehicle ', vehicle.name, ' has reached the end of its path at time ', self.time)
-                del self.vehicles[count] #remove the vehicle when it has reached it's destination
+        if self.verbose>=1:
+            for vehicle in self.vehicles:
+                #logging
+                if self.verbose==1:
+                    vehicle.verbose_stop()
+                elif self.verbose>=2:
+                    vehicle.verbose_position()
+        for vehicle in self.fleet.step():
+            if self.verbose>=1:
+                print('a vehicle ', vehicle.name, ' has reached the end of its path at time ', self.time)
+            for agent_index in vehicle.onboard_agents():
+                self.agents.release(agent_index) #agents still aboard can no longer reach their destination
 
     #create vehicles at nodes as needed by the schedule
     def assign_vehicles_schedule(self):
-        #run through the all the schedules in the dispatch list
-        num_schedules = len(self.schedules)
-        for i in range(num_schedules):
-            if len(self.dispatch_schedule2[i])>0: #if there are still schedules left to be dispatched
-                if self.time == self.dispatch_schedule2[i][0]: #a vehicle of this schedule is required to be created a the current time
-                    self.create_vehicle(self.schedules[i])
-                    self.dispatch_schedule2[i].pop(0) #remove the first element of the list as the vehicle has been created at the required time
+        #take the schedules which are due to dispatch a vehicle from the dispatch queue
+        for i in self.dispatch_queue.pop_due(self.time):
+            self.create_vehicle(self.schedules[i]) #a vehicle of this schedule is required to be created at the current time
 
     #create passengers with pathfinding done at the node level rather than the agent level
     def create_all_passengers_pathfinding(self):
-        num_nodes = len(self.node_names)
-        for i in range(num_nodes): #go through all the nodes we are starting from
+        for i,num_passengers_to_node in self.passengers_by_origin(): #go through all the nodes we are starting from, with the number of passengers going to each node
             start_node = self.nodes[i] #extract a reference to the starting node
-            num_passengers_to_node = np.zeros(num_nodes)
-            #calculate the number of passengers going to each node
-            for j in range(num_nodes):
-                end_node = self.nodes[j] #extract a reference to that node
-                num_passengers_pair = self.origin_destination_trips[i,j] #extract number of passengers going between these node pairs
-                num_passengers_per_min = (num_passengers_pair/60)*self.passenger_time_multiplier #we create passengers every minute, but statistics are per hour
-                #create the required number of passengers
-                int_num_passengers = int(num_passengers_per_min) #rounded-down number of passengers to create
-                chance_additional_passenger = num_passengers_per_min-int_num_passengers #chance of an additional passenger being created from the remainder
-                num_passengers_to_node[j] = int_num_passengers + random_true(chance_additional_passenger) #get the final number of passengers to be created
             # now determine the path to all the nodes, the number of passengers travelling to each node and the number of passengers which failed to reach their destination
-            path_to_nodes,num_passengers_created,num_unreachable_passengers = start_node.find_paths(num_passengers_to_node,self.time)
+            if self.routing_engine=='csa':
+                router = self.connection_scan
+                num_passengers_created,num_unreachable_passengers = router.find_paths(i,num_passengers_to_node,self.time)
+            elif self.routing_engine=='raptor':
+                router = self.raptor
+                num_passengers_created,num_unreachable_passengers = router.find_paths(i,num_passengers_to_node,self.time)
+            else:
+                router = start_node
+                num_passengers_created,num_unreachable_passengers = router.find_paths(num_passengers_to_node,self.time)
             self.num_successful_agents = self.num_successful_agents + np.sum(num_passengers_created) #record total successful pathfinding agents
             self.num_failed_agents = self.num_failed_agents + num_unreachable_passengers  #record total failed pathfinding agents
 
             # now lets create the actual passengers
-            for j in range(num_nodes): #go through all the nodes we are ending up at
+            for j in np.flatnonzero(num_passengers_created>0): #go through all the nodes passengers are ending up at
                 num_passengers = num_passengers_created[j]
-                if num_passengers>0:
-                    end_node = self.nodes[j]
-                    path = copy.deepcopy(path_to_nodes[j])
-                    new_agent = a.Agent(start_node,end_node,self.agent_id_counter,self.time,self,num_passengers,path) #create the new passenger
-                    self.agents.append(new_agent) #create the new passengers and add to the list
-                    self.agent_ids.append(self.agent_id_counter) #store the id of the newly created passenger
-                    self.agent_id_counter = self.agent_id_counter + 1 #increment the id counter
-                    #assign the passenger to their starting station
-                    start_node.add_agent(new_agent)
+                end_node = self.nodes[j]
+                path = router.build_path(j) #only build paths to nodes passengers are actually travelling to
+                new_agent_index = self.agents.add(start_node.id,end_node.id,self.time,num_passengers,path) #create the new passenger in the agent store
+                #assign the passenger to their starting station
+                start_node.add_agent(new_agent_index)
             
+    #provide the passengers created now as a list of (origin, number of passengers going to each node), for the origins where passengers start, in increasing order of origin
+    #with a demand stream only the stream's entries for now are read, otherwise the number of passengers between every pair of nodes is drawn at once
+    def passengers_by_origin(self):
+        num_nodes = len(self.nodes)
+        if self.demand_stream is not None:
+            passengers = []
+            for origin,destinations,counts in self.demand_stream.demand_by_origin_at(self.time):
+                num_passengers_to_node = np.zeros(num_nodes)
+                num_passengers_to_node[destinations] = counts
+                passengers.append((origin,num_passengers_to_node))
+            return passengers
+        if self.passenger_time_multiplier<=0:
+            return [] #no passengers are created at this time
+        num_passengers_per_min = self.origin_destination_trips*(self.passenger_time_multiplier/60) #we create passengers every minute, but statistics are per hour
+        num_passengers_all = demand.sample_trips(self.demand_rng,num_passengers_per_min)
+        origins_with_passengers = np.flatnonzero(np.sum(num_passengers_all,axis=1)>0) #nodes where passengers start this minute
+        return [(i,num_passengers_all[i]) for i in origins_with_passengers.tolist()]
+
     #create new passengers at stations, going between each node pair
     def create_all_passengers(self):
         num_nodes = len(self.node_names)
@@ -515,14 +591,13 @@ class Network:
     #create a single passenger
     def create_passenger(self,start_node,end_node,num_passengers):
         #create the passenger
-        new_agent = a.Agent(start_node,end_node,self.agent_id_counter,self.time,self,num_passengers)
-        if new_agent.found_path == True:
+        new_agent = a.Agent(start_node,end_node,len(self.agents),self.time,self,num_passengers,None)
+        found_path = new_agent.pathfind()
+        if found_path == True:
             #create the new passenger if they can find a path to their destination
-            self.agents.append(new_agent) #create the new passengers and add to the list
-            self.agent_ids.append(self.agent_id_counter) #store the id of the newly created passenger
-            self.agent_id_counter = self.agent_id_counter + 1 #increment the id counter
+            new_agent_index = self.agents.add(start_node.id,end_node.id,self.time,num_passengers,new_agent.destination_path) #add the passenger to the agent store
             #assign the passenger to their starting station
-            start_node.add_agent(new_agent)
+            start_node.add_agent(new_agent_index)
             self.num_successful_agents = self.num_successful_agents + num_passengers
         else:
             #if we cannot find a path to their destination, uncreate the agent
@@ -540,69 +615,55 @@ class Network:
 
 
     #passengers alight from vehicles which have stopped
-    def alight_passengers(self):
+    #by default the fleet provides the stopped vehicles, the event driven simulation provides just the vehicles it knows have stopped
+    def alight_passengers(self,vehicles=None):
+        if vehicles is None:
+            vehicles = self.fleet.stopped_vehicles()
         #loop through all vehicles
-        for i,vehicle in enumerate(self.vehicles):
+        for i,vehicle in enumerate(vehicles):
              #if a vehicle is at stop, passengers may alight
             if vehicle.state == 'at_stop':
                 stop_node = vehicle.previous_stop #where did the vehicle stop
                 #stop_node.next_vehicle_changed = True #the next vehicle stopping at this node will now be different (I don't think this is needed for alighting)
-                schedule_name = vehicle.schedule_name
-                copy_vehicle_agents = copy.copy(vehicle.agents) #create a shallow copy of the list of agents at the vehicle (agents will be the same, but references will be independent
-                num_removed = 0 #keep of number removed so we can pop the right agents
-                #go through all the agents on the vehicle
-                for j,agent in enumerate(copy_vehicle_agents):
-                    alight_status = agent.alight(stop_node.name)
-                    if agent.done==True: #we will not waste our time processing agents that have reached their destination
-                        pass
-                    else:
-                        if alight_status == 1: #agent is alighting
-                            agent = vehicle.alight_agent(j-num_removed) #remove them from the list of agents at the vehicle
-                           # print('type ',type(agent),' name',agent.name) #DEBUG
-                            num_removed = num_removed + 1
-                            stop_node.add_agent(agent) #and add them to list of agents at the station
-                        elif alight_status == 2: #agent is alighting at their destination
-                            agent = vehicle.alight_agent(j-num_removed) #remove them from the list of agents at the vehicle
-                          #  print('type ',type(agent),' name',agent.name) #DEBUG
-                            num_removed = num_removed + 1
-                            agent.done = True  #mark the agent as having achieved their goals
-                        elif alight_status == 0: #agent is not alighting
-                            pass
+                agents = self.agents
+                #only the agents alighting at this node are looked at, the vehicle has already removed them
+                for agent_index in vehicle.alight_agents(stop_node.id):
+                    alight_status = agents.alight(agent_index,stop_node.id)
+                    if alight_status == 1: #agent is alighting
+                        stop_node.add_agent(agent_index) #and add them to list of agents at the station
+                    elif alight_status == 2: #agent is alighting at their destination
+                        agents.retire(agent_index,self.time,self.trip_records)  #record the agent's trip, and release the agent
 
     #passengers board vehicles which have stopped
-    def board_passengers(self):
+    def board_passengers(self,vehicles=None):
+        if vehicles is None:
+            vehicles = self.fleet.stopped_vehicles()
          #loop through all vehicles
-        for i,vehicle in enumerate(self.vehicles):
+        for i,vehicle in enumerate(vehicles):
             if vehicle.state == 'at_stop':
                 #if a vehicle is at stop, we need to board passengers
                 stop_node = vehicle.previous_stop #where did the vehicle stop
                 stop_node.next_vehicle_changed = True #the next vehicle stopping at this node will now be different
-                schedule_name = vehicle.schedule_name
-                copy_stop_node_agents = copy.copy(stop_node.agents) #create a shallow copy of the list of agents at the node (agents will be the same, but references will be independent)
-                num_removed = 0 #keep of number removed so we can pop the right agent
-                for j,agent in enumerate(copy_stop_node_agents): #go through all the agents where the vehicle stopped
-                    original_path = copy.deepcopy(agent.destination_path)
-                    will_board = agent.board(schedule_name)
-                    if will_board == True:
-                        #if the agent is getting on the vehicles
-                        vehicle_capacity = vehicle.get_capacity()
-                        agent_passengers = agent.number_passengers
-                        if agent_passengers<=vehicle_capacity:
-                            agent = stop_node.remove_agent(j-num_removed) #remove them from the list of agents at the node, making sure to account for the change in the array size due to removed agents
-                            vehicle.board_agent(agent) #have the agents board the vehicle
-                            num_removed = num_removed + 1 #we have removed another agent
-                        elif vehicle_capacity==0:
-                            agent.destination_path = original_path
-                        else:
-                            leftover_passengers = agent_passengers-vehicle_capacity
-                            agent = stop_node.agents[j-num_removed]
-                            copy_agent = a.Agent(agent.start_node,agent.destination_node,agent.id,agent.start_time,agent.network,vehicle_capacity,copy.deepcopy(agent.destination_path))
-                            agent.num_passengers = leftover_passengers
-                            agent.destination_path = original_path 
-                            vehicle.board_agent(copy_agent)
+                schedule_id = vehicle.schedule_id
+                queue = stop_node.boarding_queue(schedule_id) #only agents waiting for this schedule will board
+                if queue is None:
+                    continue
+                agents = self.agents
+                while len(queue)>0: #agents board in the order they arrived at the station
+                    agent_index = queue[0]
+                    vehicle_capacity = vehicle.get_capacity()
+                    agent_passengers = agents.number_passengers[agent_index]
+                    if agent_passengers<=vehicle_capacity:
+                        stop_node.remove_next_agent(schedule_id) #remove them from the station
+                        agents.board(agent_index,schedule_id)
+                        vehicle.board_agent(agent_index) #have the agents board the vehicle
                     else:
-                        #if agent is not boarding, we do not need to do anything
-                        pass
+                        if vehicle_capacity>0:
+                            #split the passengers who fit into a new agent, which shares the path with the part left behind
+                            copy_agent_index = stop_node.split_next_agent(schedule_id,vehicle_capacity)
+                            agents.board(copy_agent_index,schedule_id)
+                            vehicle.board_agent(copy_agent_index)
+                        break #the vehicle is full, so no one else can board
 
     #update time by one unit        
     def update_time(self):
@@ -627,65 +688,152 @@ class Network:
         self.time = self.time + 1 #increment time
 
     #run for a certain amount of time
-    def basic_sim(self):
+    #if trace_path is given, the logs are streamed to a trace at that path (see simulation_trace.TraceWriter) rather than kept in memory, and read back from it
+    def basic_sim(self,trace_path=None):
         self.time = 0
-        self.times = []
+        self.dispatch_queue = schedule.DispatchQueue(self.dispatch_schedule2) #start dispatching from the first service of each schedule
         final_time = self.stop_simulation_time #determine when the simulation will end
-        self.vehicle_logging_init() #initialise vehicle logging
-        self.node_logging_init() #initialise node logging
+        self.logging_init(final_time,trace_path) #initialise vehicle and node logging
         #create lists to store latitudes,longitudes and names of vehicles over time as lists of lists
         old_real_time = time.time() 
-        while self.time<final_time:#till we reach the specified time
-            self.update_time() #run the simulation
-            self.times.append(self.time) #store the current time
-            self.get_vehicle_data_at_time() #extract vehicle data at the current time
-            self.get_node_data_at_time() #extract node data at the current time
-            print("TIME ", self.time,'step took time ',time.time()-old_real_time)
-            old_real_time = time.time()
+        completed = False
+        try:
+            while self.time<final_time:#till we reach the specified time
+                self.update_time() #run the simulation
+                self.record_data_at_time() #store the current time, and vehicle and node data at the current time
+                print("TIME ", self.time,'step took time ',time.time()-old_real_time)
+                old_real_time = time.time()
+            completed = True
+        finally:
+            self.logging_finish(completed) #finish writing the trace, if there is one, even if the simulation raised an error
         print("number of passengers who could reach their destination ",self.num_successful_agents)
         print("number of passengers who failed to reach their destination ",self.num_failed_agents)
         return self.times,self.vehicle_latitudes,self.vehicle_longitudes,self.store_vehicle_names,self.vehicle_passengers,self.node_passengers,self.num_failed_agents,self.num_successful_agents,final_time #return relevant data from the simulation to the calling code
         
-    #class to initialise class variables to store data about the vehicles as lists of lists
-    def vehicle_logging_init(self):
-        self.vehicle_latitudes = []
-        self.vehicle_longitudes = []
-        self.store_vehicle_names = []
-        self.vehicle_passengers = []
-
-    #class to initalise class variables to store data about nodes as lists of lists
-    def node_logging_init(self):
-        self.node_passengers = []
-
-    #get relevant data about all vehicles in the network at the present time and store them in lists
-    def get_vehicle_data_at_time(self):
-        current_vehicle_latitudes = []
-        current_vehicle_longitudes = []
-        current_vehicle_names = []
-        current_vehicle_passenger_counts = []
-        for vehicle in self.vehicles:
-            #extract and store the data at the current time in a list
-            latitude,longitude = vehicle.get_coordinates() #get the latitude, longitude and direction of the vehicle
-            current_vehicle_latitudes.append(latitude)
-            current_vehicle_longitudes.append(longitude)
-            current_vehicle_names.append(vehicle.name)
-            current_vehicle_passenger_counts.append(vehicle.count_agents())
-            if self.verbose>=1:
+    #run the simulation as basic_sim does, but only doing work for the events which happen at each time
+    #vehicles stopping and passengers being created are kept in a heap of (time, kind of event, order, vehicle), vehicles being dispatched are taken from the dispatch queue
+    #in minutes with no events vehicles are only moved and logged, so the logged outputs are the same as basic_sim's
+    #when no event is due before the next event time, every minute up to it is moved and logged in one vectorised step (see skip_idle_minutes)
+    #when passengers are created every minute, as with the Sydney scenarios, there are no idle minutes and event_sim is no faster than basic_sim
+    def event_sim(self,trace_path=None):
+        self.time = 0
+        self.dispatch_queue = schedule.DispatchQueue(self.dispatch_schedule2) #start dispatching from the first service of each schedule
+        final_time = self.stop_simulation_time #determine when the simulation will end
+        self.logging_init(final_time,trace_path) #initialise vehicle and node logging
+        events = []
+        for demand_time in self.demand_times(final_time):
+            events.append((demand_time,DEMAND_EVENT,0,None))
+        heapq.heapify(events)
+        vehicle_counter = 0 #number of vehicles created, vehicles stopping at the same time are processed in the order they were created, which is their order in self.vehicles
+        old_real_time = time.time()
+        completed = False
+        try:
+            while self.time<final_time:#till we reach the specified time
+                next_event_time = min(events[0][0] if len(events)>0 else final_time,self.dispatch_queue.next_time(),final_time)
+                num_idle_minutes = int(np.ceil(next_event_time))-self.time #events are handled at the first minute at or after their time
+                if num_idle_minutes>1 and self.verbose<1: #verbose runs print every vehicle every minute, so are not skipped
+                    self.skip_idle_minutes(num_idle_minutes)
+                    old_real_time = time.time()
+                    continue
+                self.move_vehicles() #move vehicles around the network
+                stopped_vehicles = [] #(order of creation, vehicle) of vehicles stopped now
+                create_passengers = False
+                while len(events)>0 and events[0][0]<=self.time: #extract all the events happening now
+                    event_time,event_kind,event_order,event_vehicle = heapq.heappop(events)
+                    if event_kind==VEHICLE_STOP_EVENT:
+                        stopped_vehicles.append((event_order,event_vehicle))
+                    elif event_kind==DEMAND_EVENT:
+                        create_passengers = True
+                if create_passengers==True:
+                    self.update_nodes_next_vehicle() #only needed when pathfinding, skipped updates are caught up here
+                self.alight_passengers([vehicle for order,vehicle in stopped_vehicles]) #passengers alight from vehicles
+                for i in self.dispatch_queue.pop_due(self.time):
+                    self.create_vehicle(self.schedules[i]) #create new vehicles at scheduled locations
+                    stopped_vehicles.append((vehicle_counter,self.vehicles[-1])) #new vehicles start stopped at their first node
+                    vehicle_counter = vehicle_counter+1
+                if create_passengers==True:
+                    self.update_passenger_time_multiplier()
+                    self.create_all_passengers_pathfinding() #create new passengers
+                self.board_passengers([vehicle for order,vehicle in stopped_vehicles]) #passengers board vehicles
+                for order,vehicle in stopped_vehicles: #find when each stopped vehicle will next stop
+                    time_to_next_stop = vehicle.time_to_next_stop()
+                    if time_to_next_stop is not None:
+                        heapq.heappush(events,(self.time+time_to_next_stop,VEHICLE_STOP_EVENT,order,vehicle))
+                self.time = self.time + 1 #increment time
+                self.record_data_at_time() #store the current time, and vehicle and node data at the current time
+                if self.verbose>=1:
+                    print("TIME ", self.time,'step took time ',time.time()-old_real_time)
+                old_real_time = time.time()
+            completed = True
+        finally:
+            self.logging_finish(completed) #finish writing the trace, if there is one, even if the simulation raised an error
+        print("number of passengers who could reach their destination ",self.num_successful_agents)
+        print("number of passengers who failed to reach their destination ",self.num_failed_agents)
+        return self.times,self.vehicle_latitudes,self.vehicle_longitudes,self.store_vehicle_names,self.vehicle_passengers,self.node_passengers,self.num_failed_agents,self.num_successful_agents,final_time #return relevant data from the simulation to the calling code
+
+    #run num_idle_minutes minutes in which no vehicle stops, no vehicle is dispatched and no passengers are created
+    #the first minute is run as usual, as vehicles which stopped the minute before leave their stop or are removed in it
+    #every vehicle is then moving and none reaches a stop before the next event, so the other minutes only change the vehicle positions
+    #they are moved and logged in one step, with the passengers in each vehicle and at each node the same as in the first minute
+    def skip_idle_minutes(self,num_idle_minutes):
+        self.move_vehicles()
+        self.time = self.time + 1
+        self.record_data_at_time()
+        num_skipped_minutes = num_idle_minutes-1
+        num_vehicles = len(self.fleet)
+        latitudes,longitudes = self.fleet.advance(num_skipped_minutes)
+        node_loads = np.fromiter((node.count_agents() for node in self.nodes),dtype=np.int32,count=len(self.nodes))
+        span_times = np.arange(self.time+1,self.time+num_idle_minutes)
+        self.recorder.record_span(span_times,self.fleet.vehicle_ids[:num_vehicles],latitudes,longitudes,self.fleet.loads[:num_vehicles],node_loads)
+        self.time = self.time + num_skipped_minutes
+
+    #times before final_time at which passengers are created, either from the demand stream or whenever the passenger time multiplier is positive
+    def demand_times(self,final_time):
+        if self.demand_stream is not None:
+            tick_counts = np.diff(self.demand_stream.tick_offsets)
+            return [t for t in np.flatnonzero(tick_counts).tolist() if t<final_time]
+        return [t for t in range(int(np.ceil(final_time))) if demand.interpolate_time_multiplier(t,self.traffic_multiplier,self.traffic_time_gap,self.stop_simulation_time)>0]
+
+    #create the recorder which logs vehicle and node data, and views of its logs in the same form as lists of lists (indexed by time, then vehicle or node)
+    #when tracing, the logs are written to disk as they are recorded, and the views are made once the trace has been written
+    def logging_init(self,final_time,trace_path=None):
+        if trace_path is None:
+            self.recorder = recorder.SimulationRecorder(len(self.nodes),self.vehicle_names,time_capacity=int(np.ceil(final_time)))
+            self.logging_views(self.recorder)
+        else:
+            self.recorder = simulation_trace.TraceWriter(trace_path,len(self.nodes),self.vehicle_names,final_time=final_time)
+
+    #finish logging, when tracing the trace is closed and opened again to read the logs from it
+    #completed is False if the simulation stopped before its final time, the trace is then closed but marked as incomplete
+    def logging_finish(self,completed=True):
+        if isinstance(self.recorder,simulation_trace.TraceWriter):
+            self.recorder.set_passenger_counts(self.num_failed_agents,self.num_successful_agents)
+            self.recorder.close(completed)
+            if completed==True:
+                self.logging_views(simulation_trace.open_trace(self.recorder.path))
+
+    #store views of the logs of a recorder (or a trace being read)
+    def logging_views(self,source):
+        self.times = source.times_view()
+        self.vehicle_latitudes = source.vehicle_latitudes_view()
+        self.vehicle_longitudes = source.vehicle_longitudes_view()
+        self.store_vehicle_names = source.vehicle_names_view()
+        self.vehicle_passengers = source.vehicle_passengers_view()
+        self.node_passengers = source.node_passengers_view()
+
+    #log the current time, and the position and passengers of all vehicles and passengers at all nodes
+    #vehicle data is read for the whole fleet at once
+    def record_data_at_time(self):
+        latitudes,longitudes = self.fleet.coordinates() #get the latitude and longitude of every vehicle
+        num_vehicles = len(self.fleet)
+        node_loads = np.fromiter((node.count_agents() for node in self.nodes),dtype=np.int32,count=len(self.nodes))
+        if isinstance(self.recorder,simulation_trace.TraceWriter):
+            self.recorder.set_passenger_counts(self.num_failed_agents,self.num_successful_agents) #so that the trace can be evaluated, even if the run stops part way
+        self.recorder.record(self.time,self.fleet.vehicle_ids[:num_vehicles],latitudes,longitudes,self.fleet.loads[:num_vehicles],node_loads)
+        if self.verbose>=1:
+            for vehicle in self.vehicles:
                 print('vehicle ',vehicle.name) #DEBUG
                 print('num passengers ',vehicle.count_agents())
-            #print(longitude) #DEBUG
-        #and store that list in a list containing data for all time
-        self.vehicle_latitudes.append(current_vehicle_latitudes)
-        self.vehicle_longitudes.append(current_vehicle_longitudes)
-        self.store_vehicle_names.append(current_vehicle_names)
-        self.vehicle_passengers.append(current_vehicle_passenger_counts)
-
-    #get relevant data about all nodes in the network at the present time and store them in lists
-    def get_node_data_at_time(self):
-        current_node_passenger_counts = []
-        for node in self.nodes:
-            current_node_passenger_counts.append(node.count_agents())
-        self.node_passengers.append(current_node_passenger_counts)
                    
     #call the correct schedule generation code based on the mode we are using
     def create_schedules(self):
@@ -722,6 +870,7 @@ class Network:
             segment_reverse_names.append(reverse_segment_name)
         #merge regular and reverse list
         segment_names = segment_names + segment_reverse_names
+        segment_registry = registry.NameRegistry(segment_names) #lookup of the index of a segment by name
         segment_txt_schedules = segment_txt_schedules + segment_reverse_txt_schedules
         #extract node names from the segments
         all_segment_nodes = []
@@ -745,9 +894,8 @@ class Network:
             num_segments = len(segments_in_schedule)
             first_segment = True
             for j in range(num_segments):
-                try:
-                    segment_id =  segment_names.index(segments_in_schedule[j])
-                except:
+                segment_id = segment_registry.index(segments_in_schedule[j])
+                if segment_id==-1:
                     print('error cannot find "',segments_in_schedule[j], '" in list of segment names')
                 else:
                     #if we can find the segment ids
@@ -772,21 +920,26 @@ class Network:
             schedule_strings.append(schedule_string) #and store
         #now create the actual schedule objects
         for i in range(num_schedules):
-            self.schedules.append(self.create_schedule(self.schedule_names[i],schedule_strings[i])) #create a schedule object for each schedule
+            self.schedules.append(self.create_schedule(self.schedule_names[i],schedule_strings[i],i)) #create a schedule object for each schedule
         #create the dispatch schedule
     
+    #the dispatch schedule of each schedule is an array of the times at which its services start, these are never modified
     def create_dispatch_schedule(self):
         num_schedules = len(self.schedule_names)
         self.dispatch_schedule2 = []
         for i in range(num_schedules):
             #create the dispatch schedule for each particular schedule
-            single_dispatch_schedule = []
             service_time = self.schedule_offsets[i] #extract the starting time of a service
             finish_time = self.schedule_finish[i] #and the last time at which a service can start
             service_gap = self.schedule_gaps[i]
-            while service_time<=finish_time:
-                single_dispatch_schedule.append(service_time) #add the time of the service to the dispatch schedule
-                service_time = service_time + service_gap #calculate when the next service will occur
+            if finish_time<service_time:
+                num_services = 0
+            elif service_gap<=0:
+                print('schedule ',self.schedule_names[i],' has a gap of ',service_gap,' so only one service will run')
+                num_services = 1
+            else:
+                num_services = int(np.floor((finish_time-service_time)/service_gap+1e-9))+1 #services start every gap from the first service up to the finish time
+            single_dispatch_schedule = service_time + service_gap*np.arange(num_services)
             #once we have added all the departure times for this service, store it in the overall dispatch schedules
             self.dispatch_schedule2.append(single_dispatch_schedule)
 
@@ -802,16 +955,16 @@ class Network:
         num_schedules = len(self.schedule_names)
 
         for i in range(num_schedules):
-            self.schedules.append(self.create_schedule(self.schedule_names[i],schedule_texts[i])) #create a schedule object for each schedule
+            self.schedules.append(self.create_schedule(self.schedule_names[i],schedule_texts[i],i)) #create a schedule object for each schedule
         
 
     #create a schedule object from a name and a text string
-    def create_schedule(self,name,schedule_string):
+    def create_schedule(self,name,schedule_string,id=-1):
         node_names = extract_schedule_list_txt(schedule_string) #extract node names from the schedule string
         num_nodes = len(node_names)
         node_arrival_times = np.zeros(num_nodes)#arrival times at each node, starting from 0 at the starting node
         node_counter = 0 #which node is currently the next destination
-        new_schedule = schedule.Schedule(name)
+        new_schedule = schedule.Schedule(name,id)
         previous_node_name = ""
         #add nodes and edges to the schedule
         for node_name in node_names:
@@ -834,51 +987,46 @@ class Network:
 
         #now store arrivial times in the schedule
         new_schedule.add_schedule_times(node_arrival_times)
+        new_schedule.freeze() #the schedule is shared by all of its vehicles from now on
         return new_schedule
 
     #determine which nodes have which schedules present
+    #this compiles the timetable in one pass over the schedules, and then reads the schedules stopping at each node from its inverted index
     def determine_which_nodes_have_schedule(self):
-        #go through all the nodes
-        for i,node_name in enumerate(self.node_names):
-            #find all the nodes
-            for j,schedule in enumerate(self.schedules):
-                #find out if that node name is in that schedule and if so return nodes 
-                node_found,search_node_time,nodes_after,node_times_after = schedule.node_name_in_schedule(node_name)
-                if node_found == True:
-                    #if we found the node in a schedule, add that schedule to the list of schedules stopping at that node
-                    self.nodes[i].add_stopping_schedule(self.schedule_names[j],self.dispatch_schedule2[j],search_node_time,nodes_after,node_times_after)
+        self.timetable = timetable.Timetable(self.schedules,self.dispatch_schedule2,len(self.nodes))
+        if self.routing_engine=='csa':
+            self.connection_scan = connection_scan.ConnectionScan(self.timetable)
+        elif self.routing_engine=='raptor':
+            self.raptor = raptor.Raptor(self.timetable,self.max_transfers)
+        self.fleet = fleet.Fleet(self.timetable,self.schedules,self.nodes) #state of all vehicles, vehicles add themselves when created
+        self.vehicles = self.fleet.vehicles #the fleet keeps this list in the same order as its rows
+        #go through all the nodes, each reads the schedules stopping at it from the timetable
+        for node in self.nodes:
+            node.compile_departures(self.timetable) #store their services for fast searching
 
     #add an edge between specified start and end node            
     def add_edge(self,start_node,end_node,travel_time):
         name = start_node + ' to ' + end_node
-        while name in self.edge_names:#prevent duplicate names
+        while name in self.edge_registry:#prevent duplicate names
             #note, that duplicate edge names cause problems with the creation of schedules, so try and avoid them
-            warnings.warn('duplicate edge name ', name, ' this is poorly supported, try and only have one edge directly between two nodes')
+            warnings.warn('duplicate edge name ' + name + ' this is poorly supported, try and only have one edge directly between two nodes')
             name = name + ' alt '
-        self.edge_names.append(name)#update the list of edge names
+        self.edge_registry.add(name)#update the list of edge names
         new_edge = Edge(name,start_node,end_node,travel_time)
         self.edges.append(new_edge)#and create the new edge
         #let's also add the edge to the list of edges at the node it starts from
-        i = 0 #temporary counter variable
-        for node_name in self.node_names:
-            if node_name == start_node:#if node names matches with the starting node
-                #add edge to the node
-                self.nodes[i].add_edge(new_edge)
-            else:
-                pass
-            i = i+1 
-            #increment the counter
-            pass     
+        start_index = self.node_registry.index(start_node)
+        if start_index!=-1:
+            self.nodes[start_index].add_edge(new_edge)
 
     #find the time taken to travel from the specified node to all other nodes in the network
     #note, this is making the assumption that all nodes are always traversible, the ideal case which does not apply for real passengers
     def find_distance_dijistraka(self,start_node_name):
         #try and find the starting node in the list of all nodes
-        try:
-            start_index = self.node_names.index(start_node_name)
-        except ValueError:
+        start_index = self.node_registry.index(start_node_name)
+        if start_index==-1:
             #handle case where starting name not in list of names
-            warnings.warn('start_node_name  ', start_node_name, 'is not in the list of node names in this network')
+            warnings.warn('start_node_name  ' + start_node_name + ' is not in the list of node names in this network')
             return False #return false to indicate error
         #if there was not an error, continue
         num_nodes = len(self.node_names)
@@ -894,9 +1042,8 @@ class Network:
             (edge_times,edge_destinations) = self.nodes[min_index].provide_nodes_time()
             num_edges = len(edge_times)
             for i in range(num_edges):
-                try:
-                    destination_index = self.node_names.index(edge_destinations[i])
-                except ValueError:
+                destination_index = self.node_registry.index(edge_destinations[i])
+                if destination_index==-1:
                     #handle case where destination name not in list of names
                     print('WARNING destination name  ', edge_destinations[i], 'is not in the list of node names in this network')
                     continue #skip remaining computation steps
@@ -912,9 +1059,8 @@ class Network:
     #this is the same as find_distance_dijistraka, but it also stores the path as a list of nodes
     def find_distance_dijistraka_path(self,start_node_name):
         #try and find the starting node in the list of all nodes
-        try:
-            start_index = self.node_names.index(start_node_name)
-        except ValueError:
+        start_index = self.node_registry.index(start_node_name)
+        if start_index==-1:
             #handle case where starting name not in list of names
             print('WARNING start_node_name  ', start_node_name, 'is not in the list of node names in this network')
             return False #return false to indicate error
@@ -934,9 +1080,8 @@ class Network:
             (edge_times,edge_destinations,edge_names) = self.nodes[min_index].provide_nodes_time_edge_name()
             num_edges = len(edge_times)
             for i in range(num_edges):
-                try:
-                    destination_index = self.node_names.index(edge_destinations[i])
-                except ValueError:
+                destination_index = self.node_registry.index(edge_destinations[i])
+                if destination_index==-1:
                     #handle case where destination name not in list of names
                     print('WARNING destination name', edge_destinations[i], 'is not in the list of node names in this network')
                     continue #skip remaining computation steps
@@ -953,6 +1098,63 @@ class Network:
         
         return distance_to_nodes,paths #return the distance to all the nodes
 
+    #build a compressed sparse row (CSR) representation of the edges leaving each node
+    #edges leaving node i are stored between adjacency_offsets[i] and adjacency_offsets[i+1], in the same order as in the node
+    def build_adjacency_csr(self):
+        num_nodes = len(self.node_names)
+        self.adjacency_offsets = np.zeros(num_nodes+1,dtype=np.int64)
+        self.edge_start_indices = np.zeros(len(self.edge_names),dtype=np.int64)-1 #index of the node each edge starts at, -1 if it cannot be traversed
+        destinations = []
+        times = []
+        edges = []
+        for i,node in enumerate(self.nodes):
+            (edge_times,edge_destinations,edge_names) = node.provide_nodes_time_edge_name()
+            for j,destination_name in enumerate(edge_destinations):
+                destination_index = self.node_registry.index(destination_name)
+                if destination_index==-1:
+                    #handle case where destination name not in list of names
+                    print('WARNING destination name', destination_name, 'is not in the list of node names in this network')
+                    continue #skip the edge, it cannot be traversed
+                destinations.append(destination_index)
+                times.append(edge_times[j])
+                edges.append(self.edge_registry.index(edge_names[j]))
+                self.edge_start_indices[edges[-1]] = i
+            self.adjacency_offsets[i+1] = len(destinations)
+        self.adjacency_destinations = np.array(destinations,dtype=np.int64)
+        self.adjacency_times = np.array(times,dtype=np.float64)
+        self.adjacency_edges = np.array(edges,dtype=np.int64)
+
+    #this is the same as find_distance_dijistraka_path, but it uses integer node ids, the CSR adjacency and a binary heap
+    #so each search costs O(E log N) rather than O(N^2)
+    #ties are broken on the lowest node index, so the paths found are identical to those of find_distance_dijistraka_path
+    #rather than a list of edges for every path, the path is stored as the index of the last edge used to reach each node (-1 if none)
+    def find_distance_dijistraka_heap(self,start_index):
+        num_nodes = len(self.node_names)
+        distance_to_nodes = np.ones(num_nodes)*np.inf #set initial cost to reach to be infinite, index order is same as in node names
+        predecessor_edges = np.zeros(num_nodes,dtype=np.int32)-1 #edge used to reach each node on the shortest path, -1 for the start node and unreachable nodes
+        nodes_visited = np.zeros(num_nodes,dtype=bool) #has node been visited yet
+        #extract the adjacency as python lists, indexing these is much faster than indexing numpy arrays element by element
+        offsets = self.adjacency_offsets.tolist()
+        destinations = self.adjacency_destinations.tolist()
+        times = self.adjacency_times.tolist()
+        edges = self.adjacency_edges.tolist()
+        distance_to_nodes[start_index] = 0 #cost to reach starting node is of course zero
+        heap = [(0.0,start_index)] #heap of (distance,node index) still to be visited
+        while len(heap)>0:
+            min_distance,min_index = heapq.heappop(heap) #get the unvisited node with the minimum distance
+            if nodes_visited[min_index]:
+                continue #this is an outdated entry for a node we have already visited
+            nodes_visited[min_index] = True #indicate we have visited the node
+            for k in range(offsets[min_index],offsets[min_index+1]):
+                destination_index = destinations[k]
+                new_distance = min_distance + times[k] #calculate distance to reach destination through the current node
+                if new_distance < distance_to_nodes[destination_index]:#if distance through current node is less than the current minimum distance
+                    distance_to_nodes[destination_index] = new_distance #update the distance
+                    predecessor_edges[destination_index] = edges[k] #the shortest path to the new node is the path to this node plus this edge
+                    heapq.heappush(heap,(new_distance,destination_index))
+
+        return distance_to_nodes,predecessor_edges #return the distance to all the nodes and the edge used to reach them
+
     #find the distance to travel to all nodes from all nodes
     def find_distance_to_all(self):
         num_nodes = len(self.node_names)
@@ -966,34 +1168,79 @@ class Network:
         return self.distance_to_all
     
     #as above, but also store the routes taken
+    #routes are stored as a predecessor matrix, predecessor_edges[i,j] is the last edge on the shortest path from node i to node j
     def find_distance_to_all_path(self):
         num_nodes = len(self.node_names)
         distance_arrays = [] #list to store distance arrays from a particular node
-        path_arrays = [] #list to store path lists from each node
+        predecessor_arrays = [] #list to store the predecessor edges from each node
+        self.build_adjacency_csr() #build the integer adjacency structure once, it is shared by every search
         #generate the distance arrays from each node
         for i in range(num_nodes):
-            new_distance,new_paths = (self.find_distance_dijistraka_path(self.node_names[i]))
+            new_distance,new_predecessors = self.find_distance_dijistraka_heap(i)
             distance_arrays.append(new_distance)
-            path_arrays.append(new_paths)
+            predecessor_arrays.append(new_predecessors)
 
         #and merge them into a numpy array
         self.distance_to_all = np.stack(distance_arrays)
-        self.paths_to_all = path_arrays
+        self.predecessor_edges = np.stack(predecessor_arrays)
+        self.find_path_depths() #the shortest paths have changed, so find how far down its origin's shortest path tree each node is
         return self.distance_to_all
+
+    #find the number of edges on the shortest path between every pair of nodes, -1 if there is no path
+    #the predecessor edges of each origin form a tree rooted at the origin, path_depths[i,j] is the depth of node j in the tree of origin i
+    #depths are found one level at a time for all origins together, so this costs one numpy operation per edge of the longest path
+    #the (origins, nodes, edges, parent nodes) of each level are stored in path_levels, path_levels[d-1] being the nodes at depth d, so they are found once however often edge traffic is found
+    def find_path_depths(self):
+        num_nodes = len(self.node_names)
+        origins = np.arange(num_nodes)[:,None]
+        reachable = self.predecessor_edges!=-1
+        parents = np.where(reachable,self.edge_start_indices[self.predecessor_edges],0) #node each path steps back to
+        self.path_depths = np.full((num_nodes,num_nodes),-1,dtype=np.int32)
+        self.path_depths[np.arange(num_nodes),np.arange(num_nodes)] = 0 #each origin is the root of its own tree
+        self.path_levels = []
+        level = 0
+        while True:
+            #nodes whose parent is at this level are at the next level
+            new_level = reachable & (self.path_depths==-1) & (self.path_depths[origins,parents]==level)
+            level_origins,level_nodes = np.nonzero(new_level)
+            if len(level_nodes)==0:
+                break
+            self.path_depths[level_origins,level_nodes] = level+1
+            level_edges = self.predecessor_edges[level_origins,level_nodes]
+            self.path_levels.append((level_origins,level_nodes,level_edges,self.edge_start_indices[level_edges]))
+            level = level+1
+
+    #reconstruct the shortest path between two nodes (given by index) as a list of edge indices, in order of travel
+    def get_shortest_path_edges(self,start_index,end_index):
+        path = []
+        current_index = end_index
+        edge_index = self.predecessor_edges[start_index,current_index]
+        while edge_index!=-1: #walk backwards from the end node till we reach the start node
+            path.append(int(edge_index))
+            current_index = self.edge_start_indices[edge_index]
+            edge_index = self.predecessor_edges[start_index,current_index]
+        path.reverse()
+        return path
+
+    #reconstruct the shortest path between two nodes (given by index) as a list of edge names, in order of travel
+    def get_shortest_path(self,start_index,end_index):
+        return [self.edge_names[edge_index] for edge_index in self.get_shortest_path_edges(start_index,end_index)]
     
     #find the expected traffic along each edge in each direction
-    def find_expected_edge_traffic(self):
-        #create the array 
+    #by default the network's own origin destination matrix is used, but another (eg from a different scenario) can be provided
+    #the traffic along the edge reaching a node in an origin's shortest path tree is the demand to every node in the subtree below it
+    #subtree demand is accumulated from the deepest level of every tree up to the origins, one level at a time for all origins together
+    def find_expected_edge_traffic(self,origin_destination_trips=None):
+        if origin_destination_trips is None:
+            origin_destination_trips = self.origin_destination_trips
         num_edges = len(self.edge_names)
+        subtree_traffic = np.array(origin_destination_trips,dtype=np.float64) #traffic from each origin to each node and the nodes below it in the origin's tree
         self.edge_traffic = np.zeros(num_edges)
-        #go through all the shortest path between node_pairs
-        for outer_index,paths in enumerate(self.paths_to_all):
-            for inner_index,path in enumerate(paths):
-                #extract the amount of traffic along the path between the selected nodes
-                node_to_node_traffic = self.origin_destination_trips[outer_index,inner_index]
-                for edge_name in path:#go through all the edge names in the path
-                    edge_index = self.get_edge_index(edge_name) #find the index of the edge we are pathing through
-                    self.edge_traffic[edge_index] = self.edge_traffic[edge_index] + node_to_node_traffic #add the traffic from the new edge
+        for origins,nodes,edges,parent_nodes in reversed(self.path_levels):
+            traffic = subtree_traffic[origins,nodes]
+            self.edge_traffic = self.edge_traffic + np.bincount(edges,weights=traffic,minlength=num_edges) #sum the traffic along each edge
+            np.add.at(subtree_traffic,(origins,parent_nodes),traffic) #pass the traffic up to the parent node
+        return self.edge_traffic
         
     #create a matrix of travel demand between each node using the gravity model
     def create_origin_destination_matrix(self):
@@ -1005,24 +1252,20 @@ class Network:
     #get the index of a node name in the list of nodes
     def get_node_index(self,node_name):
         #try and find the starting node in the list of all nodes
-        try:
-            index = self.node_names.index(node_name)
-            return index
-        except ValueError:
+        index = self.node_registry.index(node_name)
+        if index==-1:
             #handle case where starting name not in list of names
             print('node_name  ', node_name, 'is not in the list of node names in this network')
-            return -1 #return -1 to indicate error
+        return index #-1 indicates an error
 
     #get the index of an edge name in the list of edges
     def get_edge_index(self,edge_name):
         #try and find the starting node in the list of all nodes
-        try:
-            index = self.edge_names.index(edge_name)
-            return index
-        except ValueError:
+        index = self.edge_registry.index(edge_name)
+        if index==-1:
             #handle case where starting name not in list of names
             print('edge_name  ', edge_name, 'is not in the list of edge names in this network')
-            return -1 #return -1 to indicate error
+        return index #-1 indicates an error
 
     #get the time taken to traverse a node
     def get_edge_time(self,edge_name):
@@ -1106,26 +1349,17 @@ class Network:
 #flat distance is default amount of distance applied on top to all trips
 #iterations is how many iterations to converge
 #as yet unsure how well this handles 
-def gravity_assignment(starts,stops,distances,distance_exponent,flat_distance,verbose=1,required_accuracy=0.001,max_iterations=100):
-    distances = (distances+flat_distance)**distance_exponent #calculate distance after transforms
-    num_nodes = len(starts)
-    destination_importance_factors = np.ones(num_nodes)#correction factor used to ensure convergence of number of trips to a node with recorded number of stops at that node
-    list_trips = [] #list to store the number of trips pending conversion to a numpy array
-    for j in range(num_nodes):#go through all the starting nodes
-        this_node_starts = starts[j]#record the number of trips starting at a node
-        trip_importance = np.zeros(num_nodes)#importance of trips to each node from this node
-        for k in range(num_nodes):#go through each destination from all nodes
-            if k==j:#don't evaluate number of trips from a node to itself
-                continue
-            else:
-                distance_between = (distances[k,j]+distances[j,k]) #use the round-trip distance, as most passengers intend to return to their origin so this is what determines expected cost of the trip
-
-                trip_importance[k] = ((destination_importance_factors[k]*stops[k])/distance_between)
-        
-        num_trips = (trip_importance/np.sum(trip_importance))*this_node_starts #calculate the number of trips from this node to all other nodes
-        list_trips.append(num_trips)
-        
-    calc_trips = np.stack(list_trips)#merge the number of trips from each node to each destination into a numpy array
+#dtype sets the precision of the calculation, np.float32 halves memory use on large networks at the cost of some precision
+#the seed matrix and the balancing iterations are done as whole matrix operations, rather than looping over node pairs
+def gravity_assignment(starts,stops,distances,distance_exponent,flat_distance,verbose=1,required_accuracy=0.001,max_iterations=100,dtype=np.float64):
+    starts = np.asarray(starts,dtype=dtype)
+    stops = np.asarray(stops,dtype=dtype)
+    distances = (np.asarray(distances,dtype=dtype)+flat_distance)**distance_exponent #calculate distance after transforms
+    #use the round-trip distance, as most passengers intend to return to their origin so this is what determines expected cost of the trip
+    distance_between = distances + distances.T
+    calc_trips = stops[None,:]/distance_between #importance of trips from each node (row) to each destination (column)
+    np.fill_diagonal(calc_trips,0) #don't evaluate number of trips from a node to itself
+    calc_trips *= (starts/np.sum(calc_trips,1))[:,None] #calculate the number of trips from each node to all other nodes
     iter = 0
     while True:
         calc_stops = np.sum(calc_trips,0)
@@ -1134,7 +1368,7 @@ def gravity_assignment(starts,stops,distances,distance_exponent,flat_distance,ve
         start_correction_factor = starts/calc_starts
         abs_start_error = np.abs(start_correction_factor-1)
         abs_stop_error = np.abs(stop_correction_factor-1)
-        if (max(abs_stop_error)<required_accuracy) and (max(abs_start_error)<required_accuracy):
+        if (np.max(abs_stop_error)<required_accuracy) and (np.max(abs_start_error)<required_accuracy):
             if verbose>=1:
                 print("desired accuracy achieved after ", iter, " iterations")
             break
@@ -1145,20 +1379,11 @@ def gravity_assignment(starts,stops,distances,distance_exponent,flat_distance,ve
         else:
             iter = iter+1    
         #now apply the stop correction factor to traffic
-        for j in range(num_nodes):#go through starting node
-            for k in range(num_nodes):#go through destination node
-                calc_trips[j,k] = calc_trips[j,k]*stop_correction_factor[k] #multiply the number of trips going to each destination node by the stop correction factor of that destination
-        calc_stops = np.sum(calc_trips,0)
+        calc_trips *= stop_correction_factor[None,:] #multiply the number of trips going to each destination node by the stop correction factor of that destination
         calc_starts = np.sum(calc_trips,1)
         start_correction_factor = starts/calc_starts
-        #print('start correction factors ',start_correction_factor)
         #now apply the start correction factor to traffic
-        for j in range(num_nodes):#go through starting node
-            for k in range(num_nodes):#go through destination node
-                calc_trips[j,k] = calc_trips[j,k]*start_correction_factor[j]  #multiply the number of trips from each origin by the start correction factor of that origin
-
-        
-        #print('after start calibration')
+        calc_trips *= start_correction_factor[:,None] #multiply the number of trips from each origin by the start correction factor of that origin
 
     if verbose>=2:
         print('at the end') 
@@ -0,0 +1,117 @@
+#raptor.py
+#stores the raptor class, a round based journey planner which finds the fastest journeys for each number of transfers
+import bisect as bisect
+import numpy as np
+
+#round k of the search finds the earliest arrival at every node using at most k vehicles (k-1 transfers)
+#each round scans the schedules stopping at nodes improved in the previous round, riding the earliest service which can be caught
+#a destination's journeys from successive rounds which improve its arrival time are pareto optimal in arrival time and number of transfers
+#max_transfers bounds the number of rounds, trading routing quality for speed, None searches until no further improvement is possible
+class Raptor:
+    __slots__ = ("num_nodes","num_schedules","max_transfers","schedule_stop_nodes","schedule_stop_times","schedule_departures","node_schedules",
+                 "round_parent_nodes","round_parent_schedules","best_arrivals","best_rounds")
+
+    #extract the stops and departures of each schedule from the compiled timetable of the network
+    def __init__(self,timetable,max_transfers=None):
+        self.num_nodes = timetable.num_nodes
+        self.num_schedules = timetable.num_schedules
+        self.max_transfers = max_transfers
+        #the scans are sequential, and are faster over python lists than indexing numpy arrays one element at a time
+        self.schedule_stop_nodes = []
+        self.schedule_stop_times = []
+        self.schedule_departures = []
+        for s in range(self.num_schedules):
+            stop_nodes,stop_times = timetable.schedule_stops(s)
+            self.schedule_stop_nodes.append(stop_nodes.tolist())
+            self.schedule_stop_times.append(stop_times.tolist())
+            self.schedule_departures.append(timetable.schedule_departures(s).tolist()) #departures are in increasing order
+        self.node_schedules = [] #schedules stopping at each node and the position of the node in each schedule
+        for n in range(self.num_nodes):
+            schedule_ids,positions = timetable.schedules_at_node(n)
+            self.node_schedules.append(list(zip(schedule_ids.tolist(),positions.tolist())))
+
+    #find the pareto optimal journeys to every node where num_passengers_to_node is greater than 0, leaving the start node at start_time
+    #mirrors Node.find_paths, returning the number of passengers to each node (zero if unreachable) and the number of passengers who cannot reach their destination
+    def find_paths(self,start_index,num_passengers_to_node,start_time):
+        num_nodes = self.num_nodes
+        best_arrivals = [np.inf]*num_nodes #earliest arrival at each node over all rounds so far
+        best_arrivals[start_index] = start_time
+        best_rounds = [0]*num_nodes #round in which the earliest arrival at each node was found
+        arrivals = [np.inf]*num_nodes #earliest arrival at each node using at most k vehicles
+        arrivals[start_index] = start_time
+        parent_nodes = [-1]*num_nodes #node we boarded at to reach each node in this round
+        parent_schedules = [-1]*num_nodes #schedule we rode to reach each node in this round
+        self.round_parent_nodes = [parent_nodes]
+        self.round_parent_schedules = [parent_schedules]
+        destination_nodes = (num_passengers_to_node>0).tolist()
+        destination_indices = [j for j in range(num_nodes) if destination_nodes[j]==True]
+        latest_destination_arrival = max([best_arrivals[j] for j in destination_indices],default=start_time) #arrivals after this cannot help reach any destination
+        marked_nodes = [start_index] #nodes improved in the previous round
+        max_rounds = np.inf if self.max_transfers is None else self.max_transfers+1
+        k = 0
+        while len(marked_nodes)>0 and k<max_rounds:
+            k = k+1
+            previous_arrivals = arrivals
+            arrivals = list(previous_arrivals) #labels carry over from the previous round
+            parent_nodes = list(parent_nodes)
+            parent_schedules = list(parent_schedules)
+            #find the schedules stopping at the marked nodes, and the first marked position along each
+            marked_schedules = {}
+            for node_index in marked_nodes:
+                for schedule_id,position in self.node_schedules[node_index]:
+                    if position<marked_schedules.get(schedule_id,np.inf):
+                        marked_schedules[schedule_id] = position
+            marked_nodes = []
+            for schedule_id,first_position in marked_schedules.items():
+                stop_nodes = self.schedule_stop_nodes[schedule_id]
+                stop_times = self.schedule_stop_times[schedule_id]
+                departures = self.schedule_departures[schedule_id]
+                service_departure = np.inf #departure time of the service we are riding, infinite if we are not aboard one
+                board_node = -1
+                for p in range(first_position,len(stop_nodes)):
+                    node_index = stop_nodes[p]
+                    stop_time = stop_times[p]
+                    arrival = service_departure + stop_time
+                    #ride the current service to this node, if it is an improvement
+                    if arrival<best_arrivals[node_index] and arrival<latest_destination_arrival:
+                        arrivals[node_index] = arrival
+                        best_arrivals[node_index] = arrival
+                        best_rounds[node_index] = k
+                        parent_nodes[node_index] = board_node
+                        parent_schedules[node_index] = schedule_id
+                        marked_nodes.append(node_index)
+                        if destination_nodes[node_index]==True:
+                            latest_destination_arrival = max([best_arrivals[j] for j in destination_indices])
+                    #if we reached this node in the previous round in time, we may be able to catch an earlier service here
+                    if previous_arrivals[node_index]<=arrival:
+                        service = bisect.bisect_left(departures,previous_arrivals[node_index]-stop_time) #first service we can catch
+                        if service<len(departures) and departures[service]<service_departure:
+                            service_departure = departures[service]
+                            board_node = node_index
+            self.round_parent_nodes.append(parent_nodes)
+            self.round_parent_schedules.append(parent_schedules)
+            marked_nodes = list(set(marked_nodes))
+        self.best_arrivals = best_arrivals
+        self.best_rounds = best_rounds
+        #as with Node.find_paths, return the number of passengers going to an unreachable station as zero, and the number of passengers who failed to reach their destination
+        unreachable_nodes = np.isinf(best_arrivals) #the passenger cannot reach these nodes
+        num_unreachable_passengers = np.sum(num_passengers_to_node[unreachable_nodes]) #add them to the total of failed passengers
+        num_passengers_to_node[unreachable_nodes] = 0 #do not create any passengers trying to reach this node
+        return num_passengers_to_node,num_unreachable_passengers
+
+    #build the path to a destination using the journey found in a given round of the last call to find_paths
+    def build_round_path(self,destination_index,round_index):
+        steps = []
+        node_index = destination_index
+        k = round_index
+        while self.round_parent_nodes[k][node_index]!=-1: #walk back from the destination until we reach the start
+            steps.append(node_index)
+            steps.append(self.round_parent_schedules[k][node_index])
+            node_index = self.round_parent_nodes[k][node_index]
+            k = k-1 #we boarded using a label from the previous round
+        steps.reverse() #steps were found from the destination backwards
+        return np.array(steps,dtype=np.int32)
+
+    #build the path to a destination with the earliest arrival found by the last call to find_paths, using the fewest transfers which achieve it
+    def build_path(self,destination_index):
+        return self.build_round_path(destination_index,self.best_rounds[destination_index])
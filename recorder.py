@@ -0,0 +1,164 @@
+#recorder.py
+#stores the simulation recorder class, which logs the state of vehicles and nodes at every time of the simulation in numpy columns
+import functools as functools #for binding the column read by a view
+import numpy as np
+import columns as columns #for growing columns
+
+#the recorder keeps one row per time for the times and node loads, where node_loads is a (times x nodes) matrix
+#vehicle data is stored flat, the vehicles logged at time index t are rows vehicle_offsets[t]:vehicle_offsets[t+1] of the vehicle columns
+#vehicles are logged by id, which indexes the list of vehicle names, so each name is stored once rather than every time it is logged
+#the logs are read through record views, which behave like the lists of lists the network used to keep, so Display and Evaluator can use them unchanged
+class SimulationRecorder:
+    __slots__ = ("num_nodes","vehicle_names","num_times","time_capacity","times","node_loads","vehicle_offsets","num_vehicle_rows","vehicle_capacity",
+                 "vehicle_ids","vehicle_latitudes","vehicle_longitudes","vehicle_passengers")
+    vehicle_column_names = ("vehicle_ids","vehicle_latitudes","vehicle_longitudes","vehicle_passengers")
+
+    #vehicle_names is the network's list of vehicle names, indexed by vehicle id, which the recorder reads but does not copy
+    def __init__(self,num_nodes,vehicle_names,time_capacity=1440,vehicle_capacity=65536):
+        self.num_nodes = num_nodes
+        self.vehicle_names = vehicle_names
+        self.num_times = 0 #number of times logged
+        self.time_capacity = max(int(time_capacity),1) #number of times which can be logged before the columns must grow
+        self.times = np.zeros(self.time_capacity,dtype=np.int64) #simulation time of each log
+        self.node_loads = np.zeros((self.time_capacity,num_nodes),dtype=np.int32) #number of passengers waiting at each node
+        self.vehicle_offsets = np.zeros(self.time_capacity+1,dtype=np.int64) #first vehicle row of each time
+        self.num_vehicle_rows = 0 #number of vehicle rows logged
+        self.vehicle_capacity = vehicle_capacity #number of vehicle rows which can be logged before the columns must grow
+        self.vehicle_ids = np.zeros(vehicle_capacity,dtype=np.int32) #id of the vehicle
+        self.vehicle_latitudes = np.zeros(vehicle_capacity,dtype=np.float64)
+        self.vehicle_longitudes = np.zeros(vehicle_capacity,dtype=np.float64)
+        self.vehicle_passengers = np.zeros(vehicle_capacity,dtype=np.int32) #number of passengers in the vehicle
+
+    def __len__(self):
+        return self.num_times
+
+    #log the state of the network at a time, vehicle data is given as arrays in the same order
+    def record(self,current_time,vehicle_ids,latitudes,longitudes,passengers,node_loads):
+        if self.num_times==self.time_capacity:
+            self.grow_times()
+        t = self.num_times
+        num_vehicles = len(vehicle_ids)
+        start = self.num_vehicle_rows
+        end = start+num_vehicles
+        if end>self.vehicle_capacity:
+            while end>self.vehicle_capacity:
+                self.vehicle_capacity = self.vehicle_capacity*2
+            columns.grow_columns(self,SimulationRecorder.vehicle_column_names,start,self.vehicle_capacity)
+        self.times[t] = current_time
+        self.node_loads[t,:] = node_loads
+        self.vehicle_ids[start:end] = vehicle_ids
+        self.vehicle_latitudes[start:end] = latitudes
+        self.vehicle_longitudes[start:end] = longitudes
+        self.vehicle_passengers[start:end] = passengers
+        self.vehicle_offsets[t+1] = end
+        self.num_vehicle_rows = end
+        self.num_times = t+1
+
+    #log the state of the network at several consecutive times in which only the vehicle positions change
+    #latitudes and longitudes are (times x vehicles) arrays, the other vehicle data and the node loads are the same at every time
+    def record_span(self,span_times,vehicle_ids,latitudes,longitudes,passengers,node_loads):
+        num_span_times = len(span_times)
+        while self.num_times+num_span_times>self.time_capacity:
+            self.grow_times()
+        t = self.num_times
+        num_vehicles = len(vehicle_ids)
+        start = self.num_vehicle_rows
+        end = start+num_vehicles*num_span_times
+        if end>self.vehicle_capacity:
+            while end>self.vehicle_capacity:
+                self.vehicle_capacity = self.vehicle_capacity*2
+            columns.grow_columns(self,SimulationRecorder.vehicle_column_names,start,self.vehicle_capacity)
+        self.times[t:t+num_span_times] = span_times
+        self.node_loads[t:t+num_span_times,:] = node_loads
+        self.vehicle_ids[start:end] = np.tile(vehicle_ids,num_span_times)
+        self.vehicle_latitudes[start:end] = latitudes.ravel()
+        self.vehicle_longitudes[start:end] = longitudes.ravel()
+        self.vehicle_passengers[start:end] = np.tile(passengers,num_span_times)
+        self.vehicle_offsets[t+1:t+num_span_times+1] = start+num_vehicles*np.arange(1,num_span_times+1)
+        self.num_vehicle_rows = end
+        self.num_times = t+num_span_times
+
+    #double the number of times which can be logged
+    def grow_times(self):
+        self.time_capacity = self.time_capacity*2
+        times = np.zeros(self.time_capacity,dtype=self.times.dtype)
+        times[:self.num_times] = self.times[:self.num_times]
+        self.times = times
+        node_loads = np.zeros((self.time_capacity,self.num_nodes),dtype=self.node_loads.dtype)
+        node_loads[:self.num_times] = self.node_loads[:self.num_times]
+        self.node_loads = node_loads
+        vehicle_offsets = np.zeros(self.time_capacity+1,dtype=self.vehicle_offsets.dtype)
+        vehicle_offsets[:self.num_times+1] = self.vehicle_offsets[:self.num_times+1]
+        self.vehicle_offsets = vehicle_offsets
+
+    #provide the vehicle rows logged at a time index
+    def vehicle_rows(self,time_index):
+        return self.vehicle_offsets[time_index],self.vehicle_offsets[time_index+1]
+
+    #provide the names of the vehicles logged at a time index
+    def names_at(self,time_index):
+        start,end = self.vehicle_rows(time_index)
+        return [self.vehicle_names[vehicle_id] for vehicle_id in self.vehicle_ids[start:end].tolist()]
+
+    #provide a vehicle column logged at a time index as a list
+    def vehicle_column_at(self,column_name,time_index):
+        start,end = self.vehicle_rows(time_index)
+        return getattr(self,column_name)[start:end].tolist()
+
+    #provide the time logged at a time index
+    def time_at(self,time_index):
+        return int(self.times[time_index])
+
+    #provide the node loads logged at a time index as a list
+    def node_loads_at(self,time_index):
+        return self.node_loads[time_index].tolist()
+
+    #views of the logs in the same form as the lists of lists the network used to keep
+    def times_view(self):
+        return RecordView(self,self.time_at)
+
+    def vehicle_names_view(self):
+        return RecordView(self,self.names_at)
+
+    def vehicle_latitudes_view(self):
+        return RecordView(self,functools.partial(self.vehicle_column_at,"vehicle_latitudes"))
+
+    def vehicle_longitudes_view(self):
+        return RecordView(self,functools.partial(self.vehicle_column_at,"vehicle_longitudes"))
+
+    def vehicle_passengers_view(self):
+        return RecordView(self,functools.partial(self.vehicle_column_at,"vehicle_passengers"))
+
+    def node_passengers_view(self):
+        return RecordView(self,self.node_loads_at)
+
+    #save the logs to a .npz file, with the same column names
+    def save(self,path):
+        vehicle_columns = {column_name:getattr(self,column_name)[:self.num_vehicle_rows] for column_name in SimulationRecorder.vehicle_column_names}
+        np.savez_compressed(path,times=self.times[:self.num_times],node_loads=self.node_loads[:self.num_times],vehicle_offsets=self.vehicle_offsets[:self.num_times+1],
+                            vehicle_names=np.array(self.vehicle_names,dtype=str),**vehicle_columns)
+
+
+#read only sequence over one of the recorder's logs, indexing it gives the data logged at that time index
+class RecordView:
+    __slots__ = ("recorder","read")
+
+    def __init__(self,recorder,read):
+        self.recorder = recorder #the recorder being viewed
+        self.read = read #function giving the data logged at a time index
+
+    def __len__(self):
+        return len(self.recorder)
+
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            return [self.read(i) for i in range(*index.indices(len(self)))]
+        if index<0:
+            index = index+len(self)
+        if index<0 or index>=len(self):
+            raise IndexError('record index out of range')
+        return self.read(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.read(i)
@@ -0,0 +1,31 @@
+#registry.py
+#stores the name registry class, which provides constant time lookup of the index of a name in a list
+
+class NameRegistry:
+    __slots__ = ("names","indices")
+
+    #create the registry, optionally starting from an existing list of names
+    def __init__(self,names=None):
+        self.names = [] #list of names, in index order
+        self.indices = {} #dictionary from a name to its index in the list of names
+        if names is not None:
+            for name in names:
+                self.add(name)
+
+    #add a name to the end of the list of names, and return its index
+    #if a name is added twice, lookups return the first index (matching list.index)
+    def add(self,name):
+        index = len(self.names)
+        self.names.append(name)
+        self.indices.setdefault(name,index)
+        return index
+
+    #get the index of a name, -1 if the name is not present
+    def index(self,name):
+        return self.indices.get(name,-1)
+
+    def __contains__(self,name):
+        return name in self.indices
+
+    def __len__(self):
+        return len(self.names)
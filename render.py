@@ -7,6 +7,8 @@ import pandas as pd
 import numpy as np 
 import network as n
 import evaluator as e
+import simulation_trace as simulation_trace
+import registry as registry
 import warnings as warnings
 import cProfile as profile
 import pstats
@@ -200,6 +202,14 @@ class Display:
         #this button will play back the basic simulation
         self.view_simulation_button = tk.Button(master=self.main_controls,text="VIEW SIMULATION",fg='black',bg='white',command=self.view_simulation_click,width=20)
         self.view_simulation_button.pack()
+        #directory of a trace, if given the simulation logs are streamed to it when running, and it is where a saved trace is loaded from
+        self.trace_path_label = tk.Label(master=self.main_controls,text='TRACE PATH',fg='black',bg='white',width=20)
+        self.trace_path_label.pack()
+        self.trace_path_entry = tk.Entry(master=self.main_controls,fg='black',bg='white',width=20)
+        self.trace_path_entry.pack()
+        #this button will load the logs of a saved trace, to view or evaluate them without running the simulation
+        self.load_trace_button = tk.Button(master=self.main_controls,text="LOAD TRACE",fg='black',bg='white',command=self.load_trace_click,width=20)
+        self.load_trace_button.pack()
         #this label will provide information to the user
         self.message_header = tk.Label(master=self.main_controls,text='MESSAGE',fg='black',bg='white',width=20)
         self.message_header.pack()
@@ -480,7 +490,10 @@ class Display:
             self.log_print(simulation_start_message)
             self.message_update(simulation_start_message)
             time1 = time.time()
-            self.sim_times,self.sim_vehicle_latitudes,self.sim_vehicle_longitudes,self.sim_vehicle_names,self.sim_vehicle_passengers,self.sim_node_passengers,self.num_failed_passengers,self.num_successful_passengers,self.sim_time_taken = self.sim_network.basic_sim() #run the simulation and store the data
+            trace_path = self.trace_path_entry.get()
+            if trace_path=='':
+                trace_path = None #keep the logs in memory
+            self.sim_times,self.sim_vehicle_latitudes,self.sim_vehicle_longitudes,self.sim_vehicle_names,self.sim_vehicle_passengers,self.sim_node_passengers,self.num_failed_passengers,self.num_successful_passengers,self.sim_time_taken = self.sim_network.basic_sim(trace_path=trace_path) #run the simulation and store the data
             self.setup_default_sim_current_values() #set default values for information about specific timesteps
             self.simulation_run_flag = True #simulation has been run and relevant values have been stored
             time2 = time.time()
@@ -491,6 +504,31 @@ class Display:
             self.message_update('simulation not yet setup \n cannot run')
             self.log_print('simulation not yet setup cannot run')
     
+    #load the logs of a saved trace in place of running the simulation, the trace must have been made with the same nodes
+    #the simulation must be setup first, as viewing needs the drawn network and evaluating needs the evaluator
+    def load_trace_click(self):
+        if self.simulation_setup_flag == False:
+            self.message_update('simulation not yet setup \n cannot load trace')
+            self.log_print('simulation not yet setup cannot load trace')
+            return
+        trace_path = self.trace_path_entry.get()
+        if simulation_trace.is_trace(trace_path)==False:
+            self.message_update('trace path is not \n a valid trace')
+            return
+        trace = simulation_trace.open_trace(trace_path)
+        if trace.num_nodes!=len(self.node_names):
+            self.message_update('trace does not match \n the imported nodes')
+            self.log_print('trace has ' + str(trace.num_nodes) + ' nodes but ' + str(len(self.node_names)) + ' nodes are imported')
+            return
+        self.sim_times,self.sim_vehicle_latitudes,self.sim_vehicle_longitudes,self.sim_vehicle_names,self.sim_vehicle_passengers,self.sim_node_passengers,self.num_failed_passengers,self.num_successful_passengers,self.sim_time_taken = trace.simulation_results()
+        self.setup_default_sim_current_values() #set default values for information about specific timesteps
+        self.simulation_run_flag = True #the loaded logs can be viewed and evaluated as if the simulation had been run
+        trace_loaded_message = "trace loaded \n representing \n" + str(len(self.sim_times)) + " minutes"
+        if trace.complete==False:
+            trace_loaded_message = trace_loaded_message + "\n (incomplete run)"
+        self.log_print(trace_loaded_message)
+        self.message_update(trace_loaded_message)
+
     #set default values for current sim variables, to avoid errors if we try and render them outside of a timestep
     def setup_default_sim_current_values(self):
         num_nodes = len(self.node_names)
@@ -1344,7 +1382,8 @@ class Display:
 
     #extract the list of nodes from a csv file into a python list, and calculate global geographical information for plotting
     def extract_nodes_graph(self):
-        self.node_names = self.nodes_csv["Name"].to_list()
+        self.node_registry = registry.NameRegistry(self.nodes_csv["Name"].to_list()) #lookup of the index of a node by name
+        self.node_names = self.node_registry.names
         node_positions = self.nodes_csv["Location"].to_list()
         self.node_latitudes = []
         self.node_longitudes = []
@@ -1375,33 +1414,32 @@ class Display:
     def extract_edges_graph(self):
         edge_starts = self.edges_csv["Start"].to_list()
         edge_ends = self.edges_csv["End"].to_list()
-        self.edge_names = [] #name of the edge from start to end
-        self.edge_reverse_names = [] #name of the edge from end to start
+        self.edge_registry = registry.NameRegistry() #lookup of the index of an edge by name
+        self.edge_names = self.edge_registry.names #name of the edge from start to end
+        self.edge_reverse_registry = registry.NameRegistry() #lookup of the index of an edge by reverse name
+        self.edge_reverse_names = self.edge_reverse_registry.names #name of the edge from end to start
         num_edges = len(edge_starts)#for the purpose of plotting, a bidirectional edge is one edge
         #find the index of edge starts and ends in the list of nodes
         self.edge_start_indices = []
         self.edge_end_indices = []
         for i in range(num_edges):
             #get the start index
-            try:
-                start_index = self.node_names.index(edge_starts[i])
-            except ValueError:
-                warnings.warn('edge start ', edge_starts[i],' not present in list of node names')
-                start_index = -1 #this will cause a crash later (by design), as our program a non-existent start node
+            start_index = self.node_registry.index(edge_starts[i])
+            if start_index==-1:
+                warnings.warn('edge start ' + edge_starts[i] + ' not present in list of node names') #this will cause a crash later (by design), as our program a non-existent start node
             
             #get the end index
-            try:
-                end_index = self.node_names.index(edge_ends[i])
-            except ValueError:
-                warnings.warn('edge end ', edge_ends[i],' not present in list of node names')
-                end_index = -1 #this will cause a crash later (by design), as our program contains a non-existent end node
+            end_index = self.node_registry.index(edge_ends[i])
+            if end_index==-1:
+                warnings.warn('edge end ' + edge_ends[i] + ' not present in list of node names') #this will cause a crash later (by design), as our program contains a non-existent end node
 
-            self.edge_names.append(edge_starts[i] + ' to ' + edge_ends[i])
-            self.edge_reverse_names.append(edge_ends[i] + ' to ' + edge_starts[i])
+            self.edge_registry.add(edge_starts[i] + ' to ' + edge_ends[i])
+            self.edge_reverse_registry.add(edge_ends[i] + ' to ' + edge_starts[i])
             self.edge_start_indices.append(start_index)
             self.edge_end_indices.append(end_index)
 
         self.edge_canvas_ids = ['blank']*num_edges #store edge canvas ids in a list so we can delete them later, 'blank' indicates they have not yet been created
+        self.edge_canvas_registry = {} #lookup of the index of an edge by canvas id
         self.edge_widths = [self.default_edge_width]*num_edges #store the default width of every edge
         self.edge_colours = [self.default_edge_colour]*num_edges #store the default colour of every edge
         self.edge_arrows = [tk.NONE]*num_edges #by default there will be no arrows on an edge
@@ -1416,6 +1454,7 @@ class Display:
         self.node_below_text_ids = ['blank']*num_nodes  #canvas ids for text which could be displayed below all nodes
         self.node_above_text_ids = ['blank']*num_nodes  #canvas ids for text which could be displayed above all nodes
         self.node_canvas_ids = ['blank']*num_nodes #canvas ids for the nodes themsleves
+        self.node_canvas_registry = {} #lookup of the index of a node by canvas id
         for i in range(num_nodes):
             x,y = self.convert_lat_long_to_x_y(self.node_latitudes[i],self.node_longitudes[i])
             self.nodes_x.append(x)
@@ -1456,6 +1495,7 @@ class Display:
         self.sim_vehicles_current_length = [self.default_vehicle_length]*num_vehicles
         self.set_vehicle_colours() #set the vehicle colour based on the choosen mode
         self.vehicle_canvas_ids = ['blank']*num_vehicles #canvas ids for the nodes themsleves
+        self.vehicle_canvas_registry = {} #lookup of the index of a vehicle by canvas id
         for i in range(num_vehicles):
             x,y = self.convert_lat_long_to_x_y(self.sim_vehicles_current_latitudes[i],self.sim_vehicles_current_longitudes[i])
             x,y = self.apply_accumlated_zoom(x,y)#apply accumulated zoom to new vehicle objects
@@ -1488,6 +1528,7 @@ class Display:
                 if self.vehicle_canvas_ids[i]!='blank':
                         #delete the old oval object if one exists
                         self.canvas.delete(self.vehicle_canvas_ids[i])
+                        self.vehicle_canvas_registry.pop(self.vehicle_canvas_ids[i],None)
 
     #derender the text produced by hovering over a vehicle
     def derender_hover_vehicle_text(self):
@@ -1537,11 +1578,13 @@ class Display:
             if self.edge_canvas_ids[i]!='blank':
                 #delete the old line object if one exists
                 self.canvas.delete(self.edge_canvas_ids[i])
+                self.edge_canvas_registry.pop(self.edge_canvas_ids[i],None)
                 
             id = self.canvas.create_line(start_x,start_y,end_x,end_y,fill=colour,width=width,activewidth=width+self.active_width_addition,arrow=edge_arrow) #draw a line to represent the edge
             self.canvas.tag_bind(id,'<Enter>',self.edge_enter) #some information about the start and end nodes will be displayed when we mouse over an edge
             self.canvas.tag_bind(id,'<Leave>',self.edge_leave) #this information will stop being displayed when the mouse is no longer over the node
             self.edge_canvas_ids[i] = id
+            self.edge_canvas_registry[id] = i
 
     #draw the nodes on the canvas
     def render_nodes(self):
@@ -1560,12 +1603,14 @@ class Display:
             if self.node_canvas_ids[i]!='blank':
                 #delete the old oval object if one exists
                 self.canvas.delete(self.node_canvas_ids[i])
+                self.node_canvas_registry.pop(self.node_canvas_ids[i],None)
             id = self.canvas.create_oval(x-radius,y-radius,x+radius,y+radius,fill=colour) #draw a circle to represent the node
             self.canvas.tag_bind(id,'<Enter>',self.node_enter) #some information about the node will be displayed when the mouse is hovered over it
             self.canvas.tag_bind(id,'<Leave>',self.node_leave) #this information will stop being displayed when the mouse is no longer over the node
             self.canvas.tag_bind(id,'<Button-1>',self.node_left_click) #depending on gui_mode, information about the nodes relationship to other nodes will be displayed
             self.canvas.tag_bind(id,'<Button-2>',self.node_right_click) #depending on gui_mode, information about the nodes relationship to other nodes will be displayed
             self.node_canvas_ids[i] = id #store the id so we can delete the object later
+            self.node_canvas_registry[id] = i #and so we can find the node from the id
 
     #draw the vehicle objects on the canvas
     def render_vehicles(self):
@@ -1582,6 +1627,7 @@ class Display:
             if self.vehicle_canvas_ids[i]!='blank':
                 #delete the old rectangle object if one exists
                 self.canvas.delete(self.vehicle_canvas_ids[i])
+                self.vehicle_canvas_registry.pop(self.vehicle_canvas_ids[i],None)
             id = self.canvas.create_rectangle(x-length,y-length,x+length,y+length,fill=colour)
             self.canvas.tag_bind(id,'<Enter>',self.vehicle_enter) #some information about the vehicle will be displayed when the mouse is hovered over it
             self.canvas.tag_bind(id,'<Leave>',self.vehicle_leave) #this information will be displayed when the mouse is no longer over the vehicle
@@ -1589,6 +1635,7 @@ class Display:
             self.canvas.tag_bind(id,'<Button-2>',self.vehicle_right_click) #this information will be displayed when the mouse is no longer over the vehicle
             #add code to display info about the vehicle when we hover over it
             self.vehicle_canvas_ids[i] = id #store the id so we can delete the object later
+            self.vehicle_canvas_registry[id] = i #and so we can find the vehicle from the id
 
         self.render_hover_vehicle_text() #recreate old vehicle hover text at the new location
 
@@ -1616,7 +1663,7 @@ class Display:
     #event for when we mouse over a node, create a text box revealling node name and (planned) number of waiting passengers   
     def node_enter(self,event):
         event_id = event.widget.find_withtag('current')[0]
-        id_index = self.node_canvas_ids.index(event_id)
+        id_index = self.node_canvas_registry[event_id]
         node_name = self.node_names[id_index]
         self.log_print('node viewed ' + node_name)
         x = self.nodes_x[id_index]
@@ -1627,7 +1674,7 @@ class Display:
     #event for when the mouse leaves a node, remove the text box
     def node_leave(self,event):
         event_id = event.widget.find_withtag('current')[0]
-        id_index = self.node_canvas_ids.index(event_id)
+        id_index = self.node_canvas_registry[event_id]
         node_name = self.node_names[id_index]
         self.log_print('node left ' + node_name)
         self.canvas.delete(self.text_id) #delete the text popup from node_enter
@@ -1635,7 +1682,7 @@ class Display:
     #event for when we left-click on a node, outcome will depend on viewing mode
     def node_left_click(self,event):
         event_id = event.widget.find_withtag('current')[0]
-        id_index = self.node_canvas_ids.index(event_id) #get the index of the node which has been clicked on
+        id_index = self.node_canvas_registry[event_id] #get the index of the node which has been clicked on
         if self.last_node_right_click_index !=-1: #if a node has been right clicked on
             self.reset_edges_plot() #remove any old route
             self.plot_path_nodes(id_index,self.last_node_right_click_index,text_nodes=False,arrows=True) #draw a path from the left clicked node to the right clicked node
@@ -1647,7 +1694,7 @@ class Display:
     #event for when we right-click on a node
     def node_right_click(self,event):
         event_id = event.widget.find_withtag('current')[0]
-        id_index = self.node_canvas_ids.index(event_id) #get the index of the node which has been clicked on
+        id_index = self.node_canvas_registry[event_id] #get the index of the node which has been clicked on
         if id_index == self.last_node_left_click_index: #right clicking on a node we just left clicked on will do nothing for now
             pass
         elif self.last_node_left_click_index == -1: #as will right clicking if no left click has occured
@@ -1663,7 +1710,7 @@ class Display:
     #event for when we mouse over an edge, display text boxes above connected nodes
     def edge_enter(self,event):
         event_id = event.widget.find_withtag('current')[0]
-        id_index = self.edge_canvas_ids.index(event_id)
+        id_index = self.edge_canvas_registry[event_id]
         #find the nodes at the ends of the edge
         start_index = self.edge_start_indices[id_index]
         end_index = self.edge_end_indices[id_index]
@@ -1691,7 +1738,7 @@ class Display:
     #event for when we mouse over a vehicle
     def vehicle_enter(self,event):
         event_id = event.widget.find_withtag('current')[0]
-        id_index = self.vehicle_canvas_ids.index(event_id)
+        id_index = self.vehicle_canvas_registry[event_id]
         vehicle_name = self.sim_vehicles_current_names[id_index]
         #delete hover text if it exists
         self.derender_hover_vehicle_text()
@@ -1704,19 +1751,19 @@ class Display:
     #event for when we mouse away from a vehicle
     def vehicle_leave(self,event):
         event_id = event.widget.find_withtag('current')[0]
-        id_index = self.vehicle_canvas_ids.index(event_id)
+        id_index = self.vehicle_canvas_registry[event_id]
         #at the moment, we don't actually do anything here as we still want to display info about the vehicle when we are hovering over it
     
     #event for when we left click a vehicle
     def vehicle_left_click(self,event):
         event_id = event.widget.find_withtag('current')[0]
-        id_index = self.vehicle_canvas_ids.index(event_id)
+        id_index = self.vehicle_canvas_registry[event_id]
         #placeholder for future functionality
     
     #event for when we right click a vehicle
     def vehicle_right_click(self,event):
         event_id = event.widget.find_withtag('current')[0]
-        id_index = self.vehicle_canvas_ids.index(event_id)
+        id_index = self.vehicle_canvas_registry[event_id]
         #right clicks will reset the vehicle popup text rendering
         self.derender_hover_vehicle_text()
         self.index_vehicle_text_popup = -1
@@ -1961,13 +2008,13 @@ class Display:
 
     #extract the path between two node based on their indices
     def extract_path_node_indices(self,start_node_index,end_node_index):
-        edges_path = self.sim_network.paths_to_all[start_node_index][end_node_index]
+        edges_path = self.sim_network.get_shortest_path(start_node_index,end_node_index) #paths are reconstructed from the network's predecessor matrix on demand
         return edges_path
 
     #extract the path between two nodes
     def extract_path_nodes(self,start_node,end_node):
-        start_id = self.node_names.index(start_node) #get the id's of the starting node
-        end_id = self.node_names.index(end_node) #and the ending node
+        start_id = self.node_registry.index(start_node) #get the id's of the starting node
+        end_id = self.node_registry.index(end_node) #and the ending node
         edges_path = self.extract_path_node_indices(start_id,end_id)
         return edges_path
 
@@ -1992,19 +2039,17 @@ class Display:
 
         for edge_name in edges_path:
             #go through all the edges in the edges path
-            try:
-                #if the edge is from start to finish
-                edge_index = self.edge_names.index(edge_name)
-                reverse = False
-            except ValueError: 
+            #if the edge is from start to finish
+            edge_index = self.edge_registry.index(edge_name)
+            reverse = False
+            if edge_index==-1:
                 #if the edge is from finish to start
-                try:
-                    edge_index = self.edge_reverse_names.index(edge_name)
-                    reverse = True
-                except ValueError:
-                    #edge is in neither list
-                    warnings.warn('edge ',edge_name,' not present in list of edges')
-                    continue
+                edge_index = self.edge_reverse_registry.index(edge_name)
+                reverse = True
+            if edge_index==-1:
+                #edge is in neither list
+                warnings.warn('edge ' + edge_name + ' not present in list of edges')
+                continue
             
             #now update edge names and colours for nodes on the path
             self.edge_colours[edge_index] = self.path_edge_colour
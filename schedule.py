@@ -1,28 +1,22 @@
 #schedule.py
 #schedule class, stores the list of nodes the vehicle is trying to reach, and the edge needed to reach each node
 import numpy as np
-import copy as copy
+import heapq as heapq #for the dispatch queue
 
+#a schedule is built once, then frozen and shared by every vehicle running it
+#vehicles do not copy or consume their schedule, they keep the time they started and the index of their previous stop instead
 class Schedule:
     #initialise the empty schedule
-    __slots__ = ("name","nodes","node_names","edges","schedule_times")
+    __slots__ = ("name","id","nodes","node_names","edges","schedule_times")
 
-    def __init__(self,name):
+    def __init__(self,name,id=-1):
         self.name = name#starting node of the schedule, useful for assigning schedules to vehicles
+        self.id = id #index of the schedule in the network's list of schedules
         self.nodes = [] #list of destinations (reference to a node)
         self.node_names = [] #list of node names
         self.edges = [] #list of edges to reach each destination from previous location (reference to an edge)
         self.schedule_times = [] #list of times when we will reach the nodes we are travelling too
 
-    #create a shallow copy of the object and all it's internal data-structures, however maintain same references to nodes and edges
-    def __copy__(self):
-        #create a schedule object
-        copy_schedule = Schedule(self.name)
-        copy_schedule.nodes = copy.copy(self.nodes)
-        copy_schedule.edges = copy.copy(self.edges)
-        copy_schedule.schedule_times = copy.copy(self.schedule_times)
-        return copy_schedule
-        
     #add the first destination to the schedule
     def add_start_node(self,start_node,start_node_name):
         self.nodes.append(start_node)
@@ -40,28 +34,13 @@ class Schedule:
         final_destination = self.nodes[num_nodes-1]
         return final_destination
 
-    #provide next destination, note this requires you to have first deleted the initial destination to work correctly
-    def provide_next_destination(self):
-        #print('providing next destination, num nodes ',len(self.nodes),' num edges ',len(self.edges)) #DEBUG
-        if len(self.nodes)==0:
-            return False#return false to indicate there are no more destinations, schedule is finished
-        if len(self.nodes)>len(self.edges): #provide the start point if we are yet to remove it
-            return (True,self.nodes[0])
-        else:
-            #return true to indicate there is a next destination, provide next destination and how to get there
-            return (True,self.nodes[0],self.edges[0])
-
-    #remove the destination we just reached and the node we used to reach it    
-    def remove_reached_destination(self):
-        if len(self.nodes)==0:
-            return False#return false to indicate there are no more destinations, schedule is finished
-        if len(self.nodes)>len(self.edges): #remove the start point if we are yet to remove it
-            del self.nodes[0]
-            return True
-        else:  
-            del self.nodes[0]
-            del self.edges[0]
-            return True#return true to indicate operation successful
+    #provide the destination at a stop index, and the edge used to reach it (None for the starting node)
+    def provide_stop(self,stop_index):
+        if stop_index<0 or stop_index>=len(self.nodes):
+            return False #return false to indicate there is no such stop, schedule is finished
+        if stop_index==0:
+            return (True,self.nodes[0],None)
+        return (True,self.nodes[stop_index],self.edges[stop_index-1])
     
     def provide_name(self):
         return self.name
@@ -69,10 +48,14 @@ class Schedule:
     def add_schedule_times(self,arrival_times):
         self.schedule_times = arrival_times #this is a numpy array
 
-    #offset the schedule times by the current time to ob`tain time the time the vehicle will reach each node
-    def offset_schedule_times(self,current_time):
-        self.schedule_times = self.schedule_times + current_time
-    
+    #stop the schedule from being changed once it is built, as it is shared by all of its vehicles
+    def freeze(self):
+        self.nodes = tuple(self.nodes)
+        self.node_names = tuple(self.node_names)
+        self.edges = tuple(self.edges)
+        self.schedule_times = np.array(self.schedule_times)
+        self.schedule_times.setflags(write=False)
+
     #provide information about the schedule, namely the list of nodes and edges traversed, and the time when nodes will be reached
     def test_schedule(self):
         print('SCHEDULE ', self.name)
@@ -109,3 +92,30 @@ class Schedule:
         return length
 
 
+#queue of the times at which vehicles of every schedule are dispatched, as one heap of (dispatch time, schedule id)
+#so finding the vehicles to dispatch costs time proportional to the number dispatched, rather than the number of schedules
+class DispatchQueue:
+    __slots__ = ("heap",)
+
+    #create the queue from the dispatch times of each schedule, which are not modified
+    def __init__(self,dispatch_schedules):
+        self.heap = [(dispatch_time,schedule_id) for schedule_id,dispatch_times in enumerate(dispatch_schedules) for dispatch_time in dispatch_times]
+        heapq.heapify(self.heap)
+
+    #remove and return the ids of the schedules which are due to dispatch a vehicle by the current time, in order of dispatch time and then schedule id
+    def pop_due(self,current_time):
+        due_schedules = []
+        while len(self.heap)>0 and self.heap[0][0]<=current_time:
+            dispatch_time,schedule_id = heapq.heappop(self.heap)
+            due_schedules.append(schedule_id)
+        return due_schedules
+
+    #time of the next dispatch, infinite when the queue is empty
+    def next_time(self):
+        if len(self.heap)==0:
+            return float('inf')
+        return self.heap[0][0]
+
+    #number of dispatches left in the queue
+    def __len__(self):
+        return len(self.heap)
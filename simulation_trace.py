@@ -0,0 +1,163 @@
+#simulation_trace.py
+#stores the trace writer and reader classes, which stream the simulation logs to files on disk and open them again with memory mapping
+import json as json #for the trace index
+import os as os
+import numpy as np
+import recorder as recorder
+
+#a trace is a directory holding one raw binary file per column of recorder.SimulationRecorder, and an index (index.json)
+#the index stores the number of times and vehicle rows written, the number of nodes, the data type of every column and the vehicle names
+#columns are appended to as the simulation runs, so only one time of data is held in memory however long the simulation is
+#the index is rewritten every TRACE_INDEX_INTERVAL times and when the trace is closed, so a run which stops part way leaves a trace readable up to its last index
+#the index also stores whether the run completed and its passenger counts, so a trace can be evaluated without running the simulation again
+TRACE_INDEX_NAME = 'index.json'
+TRACE_INDEX_INTERVAL = 60 #number of times written between index writes
+TRACE_COLUMNS = {"times":"int64","node_loads":"int32","vehicle_offsets":"int64","vehicle_ids":"int32",
+                 "vehicle_latitudes":"float64","vehicle_longitudes":"float64","vehicle_passengers":"int32"}
+
+#path of the file storing a column of a trace
+def column_path(trace_path,column_name):
+    return os.path.join(trace_path,column_name+'.bin')
+
+#open a trace written by a TraceWriter
+def open_trace(trace_path):
+    return TraceReader(trace_path)
+
+#check that a directory holds a trace which can be read, printing the reason if not
+def is_trace(trace_path):
+    if os.path.isfile(os.path.join(trace_path,TRACE_INDEX_NAME))==False:
+        print(trace_path,' is not a trace, it has no ',TRACE_INDEX_NAME)
+        return False
+    return True
+
+#writes the simulation logs to a trace, taking the same calls as recorder.SimulationRecorder
+class TraceWriter:
+    __slots__ = ("path","num_nodes","vehicle_names","num_times","num_vehicle_rows","files","final_time","num_failed_passengers","num_successful_passengers")
+
+    #vehicle_names is the network's list of vehicle names, indexed by vehicle id, which is stored in the index each time it is written
+    def __init__(self,trace_path,num_nodes,vehicle_names,final_time=0):
+        os.makedirs(trace_path,exist_ok=True)
+        self.path = trace_path
+        self.num_nodes = num_nodes
+        self.vehicle_names = vehicle_names
+        self.num_times = 0 #number of times written
+        self.num_vehicle_rows = 0 #number of vehicle rows written
+        self.final_time = final_time #time the simulation runs until
+        self.num_failed_passengers = 0 #passenger counts of the simulation, stored in the index, see set_passenger_counts
+        self.num_successful_passengers = 0
+        index_path = os.path.join(trace_path,TRACE_INDEX_NAME)
+        if os.path.exists(index_path):
+            os.remove(index_path) #an old index would not match the new columns
+        self.files = {column_name:open(column_path(trace_path,column_name),'wb') for column_name in TRACE_COLUMNS}
+        self.write_column("vehicle_offsets",0) #the vehicles of time index t are rows vehicle_offsets[t]:vehicle_offsets[t+1]
+
+    def __len__(self):
+        return self.num_times
+
+    #append values to a column file
+    def write_column(self,column_name,values):
+        self.files[column_name].write(np.asarray(values,dtype=TRACE_COLUMNS[column_name]).tobytes())
+
+    #log the state of the network at a time, vehicle data is given as arrays in the same order
+    def record(self,current_time,vehicle_ids,latitudes,longitudes,passengers,node_loads):
+        self.write_column("times",current_time)
+        self.write_column("node_loads",node_loads)
+        self.write_column("vehicle_ids",vehicle_ids)
+        self.write_column("vehicle_latitudes",latitudes)
+        self.write_column("vehicle_longitudes",longitudes)
+        self.write_column("vehicle_passengers",passengers)
+        self.num_vehicle_rows = self.num_vehicle_rows + len(vehicle_ids)
+        self.write_column("vehicle_offsets",self.num_vehicle_rows)
+        self.num_times = self.num_times + 1
+        if self.num_times%TRACE_INDEX_INTERVAL==0:
+            self.write_index(complete=False)
+
+    #log the state of the network at several consecutive times in which only the vehicle positions change, as SimulationRecorder.record_span does
+    def record_span(self,span_times,vehicle_ids,latitudes,longitudes,passengers,node_loads):
+        num_span_times = len(span_times)
+        num_vehicles = len(vehicle_ids)
+        self.write_column("times",span_times)
+        self.write_column("node_loads",np.tile(node_loads,num_span_times))
+        self.write_column("vehicle_ids",np.tile(vehicle_ids,num_span_times))
+        self.write_column("vehicle_latitudes",latitudes)
+        self.write_column("vehicle_longitudes",longitudes)
+        self.write_column("vehicle_passengers",np.tile(passengers,num_span_times))
+        self.write_column("vehicle_offsets",self.num_vehicle_rows+num_vehicles*np.arange(1,num_span_times+1))
+        self.num_vehicle_rows = self.num_vehicle_rows + num_vehicles*num_span_times
+        old_num_times = self.num_times
+        self.num_times = self.num_times + num_span_times
+        if self.num_times//TRACE_INDEX_INTERVAL>old_num_times//TRACE_INDEX_INTERVAL:
+            self.write_index(complete=False)
+
+    #store the number of passengers who failed and succeeded to reach their destination so far, written with the next index
+    def set_passenger_counts(self,num_failed_passengers,num_successful_passengers):
+        self.num_failed_passengers = num_failed_passengers
+        self.num_successful_passengers = num_successful_passengers
+
+    #flush the columns and write an index covering everything written so far
+    #the index is written to a temporary file and then renamed over the old index, so a reader never sees a partly written index
+    def write_index(self,complete):
+        for file in self.files.values():
+            file.flush()
+        index = {"num_times":self.num_times,"num_vehicle_rows":self.num_vehicle_rows,"num_nodes":self.num_nodes,
+                 "columns":TRACE_COLUMNS,"vehicle_names":list(self.vehicle_names),"complete":complete,"final_time":float(self.final_time),
+                 "num_failed_passengers":float(self.num_failed_passengers),"num_successful_passengers":float(self.num_successful_passengers)}
+        index_path = os.path.join(self.path,TRACE_INDEX_NAME)
+        with open(index_path+'.tmp','w') as index_file:
+            json.dump(index,index_file)
+        os.replace(index_path+'.tmp',index_path)
+
+    #finish writing the columns and write the final index, complete is False if the simulation stopped before its final time
+    def close(self,complete=True):
+        self.write_index(complete)
+        for file in self.files.values():
+            file.close()
+
+
+#reads a trace with its columns memory mapped, so only the parts of the trace used are loaded from disk
+#the columns have the same names and layout as recorder.SimulationRecorder, so the same views of the logs are available
+#a trace which is not complete (its run stopped part way) holds the logs and passenger counts up to its last index
+class TraceReader(recorder.SimulationRecorder):
+    __slots__ = ("path","complete","final_time","num_failed_passengers","num_successful_passengers")
+
+    def __init__(self,trace_path):
+        self.path = trace_path
+        with open(os.path.join(trace_path,TRACE_INDEX_NAME),'r') as index_file:
+            index = json.load(index_file)
+        self.complete = index.get("complete",True)
+        self.final_time = index.get("final_time",0)
+        self.num_failed_passengers = index.get("num_failed_passengers",0.0)
+        self.num_successful_passengers = index.get("num_successful_passengers",0.0)
+        self.num_nodes = index["num_nodes"]
+        self.vehicle_names = index["vehicle_names"]
+        self.num_times = index["num_times"]
+        self.time_capacity = self.num_times
+        self.num_vehicle_rows = index["num_vehicle_rows"]
+        self.vehicle_capacity = self.num_vehicle_rows
+        columns = index["columns"]
+        self.times = self.map_column("times",columns,(self.num_times,))
+        self.node_loads = self.map_column("node_loads",columns,(self.num_times,self.num_nodes))
+        self.vehicle_offsets = self.map_column("vehicle_offsets",columns,(self.num_times+1,))
+        for column_name in recorder.SimulationRecorder.vehicle_column_names:
+            setattr(self,column_name,self.map_column(column_name,columns,(self.num_vehicle_rows,)))
+
+    #memory map a column file, read only
+    def map_column(self,column_name,columns,shape):
+        if int(np.prod(shape))==0:
+            return np.zeros(shape,dtype=columns[column_name]) #empty files cannot be memory mapped
+        return np.memmap(column_path(self.path,column_name),dtype=columns[column_name],mode='r',shape=shape)
+
+    def record(self,current_time,vehicle_ids,latitudes,longitudes,passengers,node_loads):
+        print('trace ',self.path,' is read only, it cannot be recorded to')
+        return False
+
+    def record_span(self,span_times,vehicle_ids,latitudes,longitudes,passengers,node_loads):
+        print('trace ',self.path,' is read only, it cannot be recorded to')
+        return False
+
+    #provide the logs and passenger counts of the trace in the same form as Network.basic_sim returns them, so they can be viewed or evaluated without running the simulation
+    def simulation_results(self):
+        if self.complete==False:
+            print('trace ',self.path,' is incomplete, its run stopped after ',self.num_times,' of ',self.final_time,' minutes')
+        return (self.times_view(),self.vehicle_latitudes_view(),self.vehicle_longitudes_view(),self.vehicle_names_view(),self.vehicle_passengers_view(),
+                self.node_passengers_view(),self.num_failed_passengers,self.num_successful_passengers,self.final_time)
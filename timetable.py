@@ -0,0 +1,64 @@
+#timetable.py
+#stores the compiled timetable class, a flat array representation of every schedule in the network and when its services depart
+import numpy as np
+
+#the timetable stores all schedules in compressed sparse row (CSR) format
+#the stops of schedule s are stop_nodes[stop_offsets[s]:stop_offsets[s+1]], reached stop_times[...] after the service departs
+#the departure times of the services of schedule s are departures[departure_offsets[s]:departure_offsets[s+1]]
+#the inverted index lists which schedules stop at each node, and at which position in the schedule
+#the schedules stopping at node n are node_stop_schedules[node_stop_offsets[n]:node_stop_offsets[n+1]], at positions node_stop_positions[...]
+#as with Schedule.node_name_in_schedule, if a schedule visits a node more than once only the first visit is indexed
+class Timetable:
+    __slots__ = ("num_schedules","num_nodes","schedule_names","stop_offsets","stop_nodes","stop_times","departure_offsets","departures",
+                 "node_stop_offsets","node_stop_schedules","node_stop_positions","stop_node_list","stop_time_list")
+
+    #compile the timetable in one pass over the schedules and their dispatch times
+    def __init__(self,schedules,dispatch_schedules,num_nodes):
+        self.num_schedules = len(schedules)
+        self.num_nodes = num_nodes
+        self.schedule_names = [schedule.name for schedule in schedules]
+        stop_nodes = []
+        stop_times = []
+        stop_lengths = []
+        departures = []
+        departure_lengths = []
+        for i,schedule in enumerate(schedules):
+            stop_nodes.extend([node.id for node in schedule.nodes])
+            stop_times.append(np.asarray(schedule.schedule_times,dtype=np.float64))
+            stop_lengths.append(len(schedule.nodes))
+            departures.append(np.asarray(dispatch_schedules[i],dtype=np.float64))
+            departure_lengths.append(len(dispatch_schedules[i]))
+        stop_lengths = np.array(stop_lengths,dtype=np.int64)
+        self.stop_offsets = np.concatenate(([0],np.cumsum(stop_lengths)))
+        self.stop_nodes = np.array(stop_nodes,dtype=np.int64)
+        self.stop_times = np.concatenate(stop_times) if self.num_schedules>0 else np.zeros(0)
+        self.departure_offsets = np.concatenate(([0],np.cumsum(departure_lengths)))
+        self.departures = np.concatenate(departures) if self.num_schedules>0 else np.zeros(0)
+        #list copies of the stops, which are faster than the arrays when pathfinding reads them one element at a time
+        self.stop_node_list = self.stop_nodes.tolist()
+        self.stop_time_list = self.stop_times.tolist()
+        #now build the inverted index from nodes to the schedules stopping at them
+        stop_schedules = np.repeat(np.arange(self.num_schedules),stop_lengths) #schedule of each stop
+        stop_positions = np.arange(len(self.stop_nodes))-np.repeat(self.stop_offsets[:-1],stop_lengths) #position of each stop in its schedule
+        junk,first_visits = np.unique(stop_schedules*num_nodes+self.stop_nodes,return_index=True) #first visit of each schedule to each node
+        order = np.lexsort((stop_schedules[first_visits],self.stop_nodes[first_visits])) #sort by node, then by schedule
+        first_visits = first_visits[order]
+        self.node_stop_schedules = stop_schedules[first_visits]
+        self.node_stop_positions = stop_positions[first_visits]
+        self.node_stop_offsets = np.concatenate(([0],np.cumsum(np.bincount(self.stop_nodes[first_visits],minlength=num_nodes))))
+
+    #provide the nodes a schedule stops at, and the time taken to reach each of them from the start of the schedule
+    def schedule_stops(self,schedule_id):
+        start = self.stop_offsets[schedule_id]
+        end = self.stop_offsets[schedule_id+1]
+        return self.stop_nodes[start:end],self.stop_times[start:end]
+
+    #provide the departure times of all the services of a schedule
+    def schedule_departures(self,schedule_id):
+        return self.departures[self.departure_offsets[schedule_id]:self.departure_offsets[schedule_id+1]]
+
+    #provide the schedules which stop at a node and the position of the node in each schedule
+    def schedules_at_node(self,node_id):
+        start = self.node_stop_offsets[node_id]
+        end = self.node_stop_offsets[node_id+1]
+        return self.node_stop_schedules[start:end],self.node_stop_positions[start:end]
@@ -1,82 +1,128 @@
 #vehicle.py
 #stores the vehicle class and related functionality
 
-import copy #for making shallow copies of schedules, we want the schedule object to be unique but the linked nodes/edges to be the same
 import schedule as Schedule
 import network as Network
+import fleet as Fleet
 #base vehicle class
+#the position of the vehicle is stored in its row of the network's fleet (see fleet.Fleet), which moves all vehicles together
+#the schedule is shared with the other vehicles running it and is not changed, the vehicle only stores when it started and its stop index in the fleet
 class Vehicle:
-    __slots__ = ("schedule","schedule_name","name","state","state_new","number_passengers","previous_stop","final_destination","at_final_destination","at_final_destination","agents","num_passengers",
-                 "max_passengers","next_destination","next_edge","edge_length","previous_stop","move_timer")
+    __slots__ = ("schedule","schedule_name","schedule_id","id","name","start_time","number_passengers","fleet","slot","alight_buckets","alight_counts","cohorts",
+                 "max_passengers","agent_store","merge_cohorts")
     #create the vehicle
-    def __init__(self,schedule,start_time,name,seated_capacity=960,standing_capacity=1680):
-        self.schedule = copy.copy(schedule)
+    #id indexes the network's list of vehicle names, which the logs are read through, so it is required and may not be negative
+    def __init__(self,schedule,start_time,name,id,seated_capacity=960,standing_capacity=1680,agent_store=None,cohorts=False,fleet=None):
+        if id<0:
+            raise ValueError('vehicle ' + str(name) + ' has a negative id ' + str(id) + ', ids index the list of vehicle names')
+        self.schedule = schedule
         self.schedule_name = self.schedule.name
+        self.schedule_id = self.schedule.id #index of the schedule in the network's list of schedules, this is what agents store in their paths
+        self.id = id #index of the vehicle's name in the network's list of vehicle names
         self.name = name
-        self.state = 'at_stop' #vehicle states are 'at_stop' and 'moving'
-        self.state_new = True #newly created, will not stop if final_destination = current destination to allow the city circle to function
-        self.schedule.offset_schedule_times(start_time)#adjust the schedule to reflect the time we started
+        self.start_time = start_time #time the vehicle started its schedule
         self.number_passengers = 0 #current number of passengers aboard the vehicle
-        check,self.previous_stop = self.schedule.provide_next_destination() #get the starting destination which will be stored as the previous stop
-        check = self.schedule.remove_reached_destination() #remove starting destination from list of destinations
-        self.final_destination = self.schedule.provide_final_destination() #get the final destination as well
-        self.at_final_destination = False #mark if a vehicle has reached it's final destination, and will be deleted next update
-        self.agents = [] #container to store agents in the vehicle
-        self.num_passengers = 0 #number of passengers in the vehicle
+        self.alight_buckets = {} #indices of agents in the vehicle, keyed by the id of the node where they will alight
+        self.alight_counts = {} #number of passengers who will alight at each node
+        self.merge_cohorts = cohorts #merge agents with the same remaining path
+        self.cohorts = {} if cohorts==True else None #when merging, the agent aboard with each origin and remaining path, keyed by alighting node id and then by agent.AgentStore.cohort_key
+        self.agent_store = agent_store #store which the agents belong to, see agent.AgentStore
+        self.fleet = fleet #fleet storing the vehicle's state, the vehicle starts stopped at the first node of its schedule
+        self.slot = fleet.add(self,self.schedule_id) #row of the vehicle in the fleet, changes as vehicles are removed
         self.max_passengers = 1610 #maximum number of passengers in the vehicle
 
+    #the state of the vehicle is read from its row in the fleet
+    @property
+    def state(self):
+        if self.fleet.states[self.slot]==Fleet.AT_STOP:
+            return 'at_stop' #vehicle states are 'at_stop' and 'moving'
+        return 'moving'
+
+    @property
+    def state_new(self): #newly created, will not stop if final_destination = current destination to allow the city circle to function
+        return bool(self.fleet.new[self.slot])
+
+    @property
+    def stop_index(self): #index of the previous stop in the schedule
+        return int(self.fleet.stop_indices[self.slot]-self.fleet.first_stops[self.schedule_id])
+
+    @property
+    def previous_stop(self):
+        return self.fleet.nodes[self.fleet.stop_nodes[self.fleet.stop_indices[self.slot]]]
+
+    @property
+    def next_destination(self):
+        return self.fleet.nodes[self.fleet.stop_nodes[self.fleet.stop_indices[self.slot]+1]]
+
+    @property
+    def final_destination(self):
+        return self.fleet.nodes[self.fleet.final_nodes[self.schedule_id]]
+
+    @property
+    def move_timer(self):
+        return int(self.fleet.move_timers[self.slot])
+
+    @property
+    def edge_length(self):
+        return self.fleet.edge_lengths[self.slot]
+
+    @property
+    def num_passengers(self): #number of passengers in the vehicle
+        return int(self.fleet.loads[self.slot])
+
+    @num_passengers.setter
+    def num_passengers(self,num_passengers):
+        self.fleet.loads[self.slot] = num_passengers
+
     #have an agent try and board the vehicle
-    def board_agent(self,agent):
-        self.agents.append(agent) #add agents to the list of agents on the vehicle
-        self.num_passengers = self.num_passengers + agent.number_passengers #the number of passengers has increased
-
-    #have an agent try and leave the vehicle
-    def alight_agent(self,id):
-        removed_agent = self.agents.pop(id)
-        self.num_passengers = self.num_passengers - removed_agent.number_passengers #the number of passengers has decreased
-        return removed_agent
+    #the agent must already have boarded, so that its next route step is where it will alight
+    #when merging cohorts, an agent with the same remaining path as one already aboard is merged into it, returns the index of the agent now aboard
+    def board_agent(self,agent_index):
+        alight_node_id = self.agent_store.next_step(agent_index)
+        number_passengers = int(self.agent_store.number_passengers[agent_index])
+        bucket = self.alight_buckets.get(alight_node_id)
+        if bucket is None:
+            bucket = []
+            self.alight_buckets[alight_node_id] = bucket
+            self.alight_counts[alight_node_id] = 0
+        self.alight_counts[alight_node_id] = self.alight_counts[alight_node_id] + number_passengers
+        self.num_passengers = self.num_passengers + number_passengers #the number of passengers has increased
+        if self.merge_cohorts==True:
+            cohorts = self.cohorts.setdefault(alight_node_id,{})
+            cohort_key = self.agent_store.cohort_key(agent_index)
+            cohort_index = cohorts.get(cohort_key)
+            if cohort_index is not None:
+                return self.agent_store.merge(cohort_index,agent_index)
+            cohorts[cohort_key] = agent_index
+        bucket.append(agent_index) #add agents to the list of agents alighting at their node
+        return agent_index
+
+    #remove all the agents alighting at a node from the vehicle, and return their indices in the order they boarded
+    def alight_agents(self,node_id):
+        alighting_agents = self.alight_buckets.pop(node_id,[])
+        self.num_passengers = self.num_passengers - self.alight_counts.pop(node_id,0) #the number of passengers has decreased
+        if self.merge_cohorts==True:
+            self.cohorts.pop(node_id,None)
+        return alighting_agents
+
+    #provide the indices of all agents in the vehicle
+    def onboard_agents(self):
+        return [agent_index for bucket in self.alight_buckets.values() for agent_index in bucket]
     
     def get_capacity(self):
         return self.max_passengers-self.num_passengers
 
-    #move the vehicle around the network according to its schedule
-    def update(self):
-        if self.state == 'at_stop': #if the vehicle was at a stop
-            #add some code to disembark passengers
-            #add some code to pick up passengers
-            if self.final_destination == self.previous_stop and self.state_new == False: #if vehicle has reached it's destination and not newly created                
-                return False #return false to indicate it should be deleted
-            #if vehicle has not reached it's final destination
-            self.state_new=False
-            check,self.next_destination,self.next_edge = self.schedule.provide_next_destination() #extract next destination and how to get there
-            self.edge_length = self.next_edge.provide_travel_time() #store the length of the next edge
-            if self.edge_length == 1: #if edge takes only 1 time unit to traverse
-                #we are immediately at the next destination
-                self.state = 'at_stop'
-                self.previous_stop = self.next_destination
-                self.schedule.remove_reached_destination() #remove the previous destination
-            else:
-                #we are now moving towards the next destination
-                self.state = 'moving'
-                self.move_timer = 1#start the move timer, we will move 1 unit of time
-
-        elif self.state == 'moving': #if the vehicle was moving
-            if self.move_timer == self.edge_length-1: # we have reached the next station
-                self.state = 'at_stop'
-                self.previous_stop = self.next_destination
-                self.schedule.remove_reached_destination() # remove the previous destination
-            else:
-                #we are still moving towards the next destination
-                self.state = 'moving'
-                self.move_timer = self.move_timer + 1
-    
-        return True          
+    #time from now until the vehicle next stops, given that it is stopped now, None if it will instead be deleted at the next update
+    #mirrors Fleet.step, where a vehicle takes the travel time of the next edge to reach the next stop
+    def time_to_next_stop(self):
+        if self.final_destination == self.previous_stop and self.state_new == False:
+            return None
+        return self.fleet.leg_times[self.fleet.stop_indices[self.slot]]
 
     #print where the vehicle is
     def verbose_position(self):
         print('vehicle ',self.name, 'is ',self.state,' path is ',self.schedule_name)
-        schedule_nodes = self.schedule.nodes
-        for node in schedule_nodes:
+        for node in self.schedule.nodes[self.stop_index+1:]: #the nodes still to be reached follow the previous stop
             print('too ',node.name)
         #print('currently is ',self.state, 'previous stop is ',self.previous_stop.name,' next stop is ',self.next_destination.name,' move timer is ',self.move_timer)
     